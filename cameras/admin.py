@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Camera, CameraSettings, CameraDiscovery
+from .models import Camera, CameraSettings, CameraMask, CameraDiscovery, DetectionNode, DetectionLease
 
 
 @admin.register(Camera)
@@ -15,7 +15,7 @@ class CameraAdmin(admin.ModelAdmin):
             'fields': ('name', 'description', 'ip_address', 'port')
         }),
         ('Configuração do Stream', {
-            'fields': ('stream_url', 'camera_type', 'username', 'password')
+            'fields': ('stream_url', 'substream_url', 'camera_type', 'username', 'password')
         }),
         ('Status e Configurações', {
             'fields': ('status', 'is_active', 'motion_detection_enabled', 'recording_enabled')
@@ -38,7 +38,9 @@ class CameraSettingsAdmin(admin.ModelAdmin):
             'fields': ('camera',)
         }),
         ('Detecção de Movimento', {
-            'fields': ('motion_sensitivity', 'motion_timeout', 'motion_start_delay')
+            'fields': ('motion_sensitivity', 'motion_timeout', 'motion_start_delay',
+                       'motion_pixel_threshold', 'motion_min_area', 'motion_min_frames', 'motion_blur_size',
+                       'detection_width', 'detection_method')
         }),
         ('Qualidade de Vídeo', {
             'fields': ('recording_quality', 'frame_rate', 'resolution_width', 'resolution_height')
@@ -46,9 +48,34 @@ class CameraSettingsAdmin(admin.ModelAdmin):
         ('Gravação', {
             'fields': ('recording_duration',)
         }),
+        ('Streams', {
+            'fields': ('live_view_stream', 'detection_stream', 'snapshot_stream')
+        }),
     )
 
 
+@admin.register(CameraMask)
+class CameraMaskAdmin(admin.ModelAdmin):
+    list_display = ['camera', 'name', 'mask_type', 'is_active', 'created_at']
+    list_filter = ['mask_type', 'is_active']
+    search_fields = ['camera__name', 'name']
+    list_editable = ['is_active']
+
+
+@admin.register(DetectionNode)
+class DetectionNodeAdmin(admin.ModelAdmin):
+    list_display = ['name', 'hostname', 'pid', 'started_at', 'last_heartbeat']
+    search_fields = ['name', 'hostname']
+    readonly_fields = ['started_at', 'last_heartbeat', 'status']
+
+
+@admin.register(DetectionLease)
+class DetectionLeaseAdmin(admin.ModelAdmin):
+    list_display = ['camera', 'node', 'acquired_at', 'expires_at']
+    list_filter = ['node']
+    search_fields = ['camera__name', 'node__name']
+
+
 @admin.register(CameraDiscovery)
 class CameraDiscoveryAdmin(admin.ModelAdmin):
     list_display = ['ip_address', 'manufacturer', 'model', 'status', 'discovered_at']
@@ -6,11 +6,13 @@ class CamerasConfig(AppConfig):
     name = 'cameras'
 
     def ready(self):
+        import multiprocessing
         import sys
-        if 'runserver' in sys.argv:
-            from cameras.motion_detection import motion_detector
+        # Shards de detecção (spawn) herdam o sys.argv do runserver e não devem reiniciar a detecção
+        if 'runserver' in sys.argv and multiprocessing.parent_process() is None:
+            from cameras.motion_detection import start_motion_detection
             import threading
             def start_motion():
                 print("🔄 Iniciando detecção de movimento automática...")
-                motion_detector.start_detection_for_all_cameras()
+                start_motion_detection()
             threading.Thread(target=start_motion, daemon=True).start() 
\ No newline at end of file
@@ -0,0 +1,195 @@
+import math
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Camera, DetectionLease, DetectionNode
+from .supervisor import detection_supervisor
+
+
+def get_lease_ttl():
+    return settings.DVR_SETTINGS.get('DETECTION_LEASE_TTL', 30)
+
+
+def alive_nodes():
+    """Nós de detecção com sinal de vida dentro do DETECTION_LEASE_TTL"""
+    return DetectionNode.objects.filter(last_heartbeat__gte=timezone.now() - timedelta(seconds=get_lease_ttl()))
+
+
+def get_nodes_status():
+    """Resumo de cada nó de detecção vivo, a partir do status que ele publica"""
+    now = timezone.now()
+    nodes = []
+    for node in alive_nodes().prefetch_related('leases'):
+        status = node.status or {}
+        nodes.append({
+            'name': node.name,
+            'hostname': node.hostname,
+            'pid': node.pid,
+            'cameras': len(node.leases.all()),
+            'heartbeat_age': round((now - node.last_heartbeat).total_seconds(), 1),
+            'total_active': status.get('total_active', 0),
+            'recording_cameras': status.get('recording_cameras', 0),
+            'reconnecting_cameras': status.get('reconnecting_cameras', 0),
+            'active_cameras': status.get('active_cameras', []),
+            # Estado e taxa de análise de cada câmera, como no status do supervisor local
+            'camera_status': status.get('cameras', []),
+        })
+    return nodes
+
+
+class DetectionDaemon:
+    """Serviço de detecção de longa duração (manage.py motion_detection run)
+
+    Cada instância se registra como DetectionNode e reivindica câmeras por
+    concessões (DetectionLease) no banco, renovadas a cada
+    DETECTION_LEASE_RENEW segundos e válidas por DETECTION_LEASE_TTL. Um nó
+    fica com no máximo sua parte das câmeras (total / nós vivos, arredondado
+    para cima) e solta o excedente quando outro nó entra, exceto câmeras com
+    incidente em gravação, que só saem depois de fechá-lo; as concessões de um
+    nó que morreu expiram e são assumidas pelos demais. As câmeras concedidas
+    rodam no DetectionSupervisor local, um processo por núcleo.
+    """
+
+    def __init__(self, name=None):
+        self.hostname = socket.gethostname()
+        self.name = name or f'{self.hostname}-{os.getpid()}'
+        self.ttl = get_lease_ttl()
+        self.renew_interval = settings.DVR_SETTINGS.get('DETECTION_LEASE_RENEW', 10)
+        self.node = None
+        self.owned = set()
+        # Última renovação bem-sucedida; sem ela por um TTL outro nó pode ter assumido as câmeras
+        self.renewed_at = 0
+        self.stop_event = threading.Event()
+
+    def run(self):
+        """Roda até SIGTERM/SIGINT, então para a detecção e solta as concessões"""
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+
+        self.register()
+        detection_supervisor.camera_ids = set()
+        detection_supervisor.start()
+        print(f"🛰️ Nó de detecção {self.name} iniciado (concessões de {self.ttl}s)")
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    self.cycle()
+                except Exception as e:
+                    print(f"❌ Erro ao renovar concessões do nó {self.name}: {e}")
+                    if self.owned and time.time() - self.renewed_at > self.ttl:
+                        # As concessões expiraram: outro nó pode estar detectando essas câmeras
+                        print(f"⚠️ Concessões expiradas sem contato com o banco; parando {len(self.owned)} câmeras")
+                        self.owned = set()
+                        self._apply()
+                self.stop_event.wait(self.renew_interval)
+        finally:
+            detection_supervisor.stop()
+            self.unregister()
+            print(f"🛑 Nó de detecção {self.name} finalizado")
+
+    def _handle_signal(self, signum, frame):
+        self.stop_event.set()
+
+    def register(self):
+        now = timezone.now()
+        self.node, _ = DetectionNode.objects.update_or_create(
+            name=self.name,
+            defaults={
+                'hostname': self.hostname,
+                'pid': os.getpid(),
+                'started_at': now,
+                'last_heartbeat': now,
+                'status': {},
+            },
+        )
+
+    def unregister(self):
+        """Remove o nó e, em cascata, as concessões, liberando as câmeras na hora"""
+        try:
+            close_old_connections()
+            DetectionNode.objects.filter(pk=self.node.pk).delete()
+        except Exception as e:
+            print(f"⚠️ Não foi possível remover o nó {self.name}: {e}")
+
+    def cycle(self):
+        """Sinal de vida, renovação, liberação do excedente e novas reivindicações"""
+        close_old_connections()
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.ttl)
+
+        status = detection_supervisor.get_status()
+        heartbeat = {'last_heartbeat': now, 'status': status}
+        if not DetectionNode.objects.filter(pk=self.node.pk).update(**heartbeat):
+            # Removido por outro nó como morto: registrar de novo
+            self.register()
+        DetectionLease.objects.filter(node=self.node).update(expires_at=expires_at)
+        self.renewed_at = time.time()
+
+        # Nós sem sinal há muito tempo: a remoção leva junto as concessões que sobraram
+        DetectionNode.objects.filter(last_heartbeat__lt=now - timedelta(seconds=self.ttl * 10)).delete()
+
+        wanted = {
+            str(camera_id)
+            for camera_id in Camera.objects.filter(status='online', is_active=True).values_list('id', flat=True)
+        }
+        owned = {
+            str(camera_id)
+            for camera_id in DetectionLease.objects.filter(node=self.node).values_list('camera_id', flat=True)
+        }
+        share = math.ceil(len(wanted) / max(1, alive_nodes().count()))
+
+        # Câmeras gravando um incidente ficam até ele fechar; o excedente sai das demais
+        recording = {camera['id'] for camera in status['cameras'] if camera['recording']}
+        excess = set(sorted(owned & wanted, key=lambda camera_id: (camera_id not in recording, camera_id))[share:])
+        released = ((owned - wanted) | excess) - recording
+        if released:
+            DetectionLease.objects.filter(node=self.node, camera_id__in=released).delete()
+            owned -= released
+
+        claimed = set()
+        if len(owned) < share:
+            taken = {
+                str(camera_id)
+                for camera_id in DetectionLease.objects.filter(expires_at__gte=now).values_list('camera_id', flat=True)
+            }
+            # Ordem aleatória: nós reivindicando ao mesmo tempo disputam câmeras diferentes
+            candidates = list(wanted - owned - taken)
+            random.shuffle(candidates)
+            for camera_id in candidates:
+                if len(owned) + len(claimed) >= share:
+                    break
+                if self.claim(camera_id, now, expires_at):
+                    claimed.add(camera_id)
+
+        if released or claimed:
+            print(f"🔀 Nó {self.name}: +{len(claimed)} / -{len(released)} câmeras (parte: {share})")
+        self.owned = owned | claimed
+        self._apply()
+
+    def claim(self, camera_id, now, expires_at):
+        """Reivindica uma câmera sem concessão ou com concessão expirada"""
+        # Atualização condicional: só um nó assume uma concessão expirada
+        if DetectionLease.objects.filter(camera_id=camera_id, expires_at__lt=now).update(
+            node=self.node, acquired_at=now, expires_at=expires_at
+        ):
+            return True
+        try:
+            with transaction.atomic():
+                DetectionLease.objects.create(camera_id=camera_id, node=self.node, acquired_at=now, expires_at=expires_at)
+            return True
+        except IntegrityError:
+            # Outro nó reivindicou primeiro
+            return False
+
+    def _apply(self):
+        """Passa as câmeras concedidas ao supervisor local"""
+        detection_supervisor.camera_ids = set(self.owned)
+        detection_supervisor.sync()
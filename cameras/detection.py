@@ -0,0 +1,682 @@
+import cv2
+import numpy as np
+import time
+from django.conf import settings
+
+
+def odd_kernel(size):
+    """Arredonda o tamanho de um kernel para o ímpar mais próximo (mínimo 3)"""
+    size = max(3, int(round(size)))
+    return size if size % 2 else size + 1
+
+
+class DetectionParams:
+    """Parâmetros de detecção de movimento de uma câmera"""
+
+    def __init__(self, pixel_threshold=25, min_area=3000, blur_size=21,
+                 dilate_iterations=2, min_motion_frames=2, working_width=320,
+                 method='frame_diff', masks=None):
+        self.pixel_threshold = pixel_threshold
+        # Área, desfoque e dilatação são expressos na resolução original do stream
+        self.min_area = min_area
+        # O kernel do GaussianBlur precisa ser ímpar
+        self.blur_size = blur_size if blur_size % 2 else blur_size + 1
+        self.dilate_iterations = dilate_iterations
+        self.min_motion_frames = min_motion_frames
+        # Largura em que a detecção é feita (0 = resolução original)
+        self.working_width = working_width
+        # 'frame_diff' (MotionPipeline) ou 'motion_vectors' (MotionVectorPipeline)
+        self.method = method
+        # Polígonos [(mask_type, [[x, y], ...]), ...] com coordenadas normalizadas
+        self.masks = masks or []
+
+    def scaled(self, scale):
+        """Parâmetros equivalentes para um frame redimensionado por scale"""
+        if scale == 1:
+            return self
+        return DetectionParams(
+            pixel_threshold=self.pixel_threshold,
+            min_area=self.min_area * scale * scale,
+            blur_size=odd_kernel(self.blur_size * scale),
+            dilate_iterations=max(1, int(round(self.dilate_iterations * scale))),
+            min_motion_frames=self.min_motion_frames,
+            working_width=self.working_width,
+            method=self.method,
+            masks=self.masks,
+        )
+
+    @classmethod
+    def from_camera(cls, camera):
+        """Lê os parâmetros do CameraSettings da câmera (padrões se não houver)"""
+        masks = [
+            (mask.mask_type, mask.points)
+            for mask in camera.masks.filter(is_active=True)
+        ]
+        camera_settings = getattr(camera, 'settings', None)
+        if camera_settings is None:
+            return cls(masks=masks)
+        return cls(
+            pixel_threshold=camera_settings.motion_pixel_threshold,
+            min_area=camera_settings.motion_min_area,
+            blur_size=camera_settings.motion_blur_size,
+            min_motion_frames=camera_settings.motion_min_frames,
+            working_width=camera_settings.detection_width,
+            method=camera_settings.detection_method,
+            masks=masks,
+        )
+
+
+class FrameState:
+    """Dados de um frame conforme ele atravessa os estágios do pipeline"""
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.image = frame
+        # image é um buffer do pipeline (pode ser alterada no lugar) e não o frame recebido
+        self.owned = False
+        self.skip = False
+        # Resolução original do stream (largura, altura) e fator até a de trabalho
+        self.source_size = None
+        self.scale = 1
+        self.motion = False
+        # Área da maior região em movimento (pixels da resolução de trabalho)
+        self.largest_area = 0
+        self.regions = 0
+        # Total de pixels alterados e retângulo (x, y, w, h) da maior região
+        # na resolução original do stream
+        self.changed_pixels = 0
+        self.bbox = None
+        # Deslocamento médio dos blocos em movimento (apenas vetores de movimento)
+        self.magnitude = 0
+        # Máscara da região analisada e posição do recorte no frame
+        self.mask = None
+        self.offset = (0, 0)
+
+    def source_area(self):
+        """Área da maior região convertida para pixels da resolução original"""
+        return int(round(self.largest_area / (self.scale * self.scale)))
+
+    def source_changed_pixels(self):
+        """Pixels alterados convertidos para a resolução original"""
+        return int(round(self.changed_pixels / (self.scale * self.scale)))
+
+    def changed_ratio(self):
+        """Fração do frame original com pixels alterados (0 a 1)"""
+        if not self.source_size:
+            return 0.0
+        return min(1.0, self.source_changed_pixels() / (self.source_size[0] * self.source_size[1]))
+
+    def source_bbox(self, x, y, w, h):
+        """Converte um retângulo da imagem de trabalho (recortada) para o stream original"""
+        x += self.offset[0]
+        y += self.offset[1]
+        return (
+            int(round(x / self.scale)),
+            int(round(y / self.scale)),
+            int(round(w / self.scale)),
+            int(round(h / self.scale)),
+        )
+
+
+class RegionMask:
+    """Máscaras poligonais de uma câmera rasterizadas por resolução
+
+    Sem polígonos de interesse todo o frame é analisado; com eles apenas o
+    seu interior. Polígonos de exclusão são removidos em seguida. O bitmap
+    (0/255) e o retângulo que envolve a área analisada são calculados uma
+    vez para cada tamanho de frame.
+    """
+
+    def __init__(self, masks):
+        self.masks = masks
+        self.cache = {}
+
+    def __bool__(self):
+        return bool(self.masks)
+
+    def get(self, width, height):
+        """Retorna (bitmap, (x, y, w, h)) para frames de width x height"""
+        key = (width, height)
+        if key not in self.cache:
+            self.cache[key] = self._rasterize(width, height)
+        return self.cache[key]
+
+    def _polygon(self, points, width, height):
+        return np.array(
+            [[round(x * (width - 1)), round(y * (height - 1))] for x, y in points],
+            dtype=np.int32,
+        )
+
+    def _rasterize(self, width, height):
+        includes = [points for mask_type, points in self.masks if mask_type == 'include']
+        excludes = [points for mask_type, points in self.masks if mask_type == 'exclude']
+
+        bitmap = np.full((height, width), 0 if includes else 255, dtype=np.uint8)
+        if includes:
+            cv2.fillPoly(bitmap, [self._polygon(points, width, height) for points in includes], 255)
+        if excludes:
+            cv2.fillPoly(bitmap, [self._polygon(points, width, height) for points in excludes], 0)
+        bitmap.setflags(write=False)
+        return bitmap, cv2.boundingRect(bitmap)
+
+
+class FrameBuffers:
+    """Buffers de saída de um estágio, reaproveitados entre frames
+
+    Dois buffers alternados: a saída de um frame continua válida durante o
+    frame seguinte, então FrameDiffStage guarda o frame anterior sem cópia.
+    Um buffer só é alocado de novo quando o formato da saída muda.
+    """
+
+    def __init__(self):
+        self.buffers = [None, None]
+        self.index = 0
+
+    def next(self, shape, dtype=np.uint8):
+        self.index ^= 1
+        buffer = self.buffers[self.index]
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype)
+            self.buffers[self.index] = buffer
+        return buffer
+
+
+class ResizeStage:
+    """Reduz o frame para a largura de trabalho antes de qualquer outro estágio"""
+
+    def __init__(self, width):
+        self.width = width
+        self.buffers = FrameBuffers()
+
+    def process(self, state):
+        height, width = state.image.shape[:2]
+        if self.width and width > self.width:
+            state.scale *= self.width / width
+            size = (self.width, int(round(height * state.scale)))
+            dst = self.buffers.next((size[1], size[0]) + state.image.shape[2:])
+            # INTER_LINEAR é ~10x mais rápido que INTER_AREA; o aliasing é
+            # removido pelo desfoque seguinte e é igual em frames consecutivos
+            state.image = cv2.resize(state.image, size, dst=dst, interpolation=cv2.INTER_LINEAR)
+            state.owned = True
+
+
+class CropStage:
+    """Recorta o frame ao retângulo da região analisada
+
+    Pixels fora do retângulo não passam pelo desfoque nem pela diferença.
+    """
+
+    def __init__(self, region):
+        self.region = region
+
+    def process(self, state):
+        height, width = state.image.shape[:2]
+        bitmap, (x, y, w, h) = self.region.get(width, height)
+        if not w or not h:
+            # Todo o frame foi excluído
+            state.skip = True
+            return
+        state.image = state.image[y:y + h, x:x + w]
+        state.mask = bitmap[y:y + h, x:x + w]
+        state.offset = (x, y)
+
+
+class MaskStage:
+    """Zera a diferença fora da região analisada (um único AND vetorizado)"""
+
+    def __init__(self):
+        self.buffers = FrameBuffers()
+
+    def process(self, state):
+        if state.mask is not None:
+            dst = state.image if state.owned else self.buffers.next(state.image.shape)
+            state.image = cv2.bitwise_and(state.image, state.mask, dst=dst)
+            state.owned = True
+
+
+class GrayscaleStage:
+    """Converte o frame para escala de cinza"""
+
+    def __init__(self):
+        self.buffers = FrameBuffers()
+
+    def process(self, state):
+        if state.image.ndim == 3:
+            dst = self.buffers.next(state.image.shape[:2])
+            state.image = cv2.cvtColor(state.image, cv2.COLOR_BGR2GRAY, dst=dst)
+            state.owned = True
+
+
+class BlurStage:
+    """Suaviza ruído do sensor antes da diferença entre frames"""
+
+    def __init__(self, size):
+        self.size = size
+        self.buffers = FrameBuffers()
+
+    def process(self, state):
+        dst = self.buffers.next(state.image.shape)
+        state.image = cv2.GaussianBlur(state.image, (self.size, self.size), 0, dst=dst)
+        state.owned = True
+
+
+class FrameDiffStage:
+    """Diferença absoluta contra o frame anterior (o primeiro frame é descartado)
+
+    O frame anterior é o buffer de saída do estágio anterior, que continua
+    válido por mais um frame (FrameBuffers); só é copiado quando a imagem é
+    o próprio frame recebido, que a fonte reaproveita na leitura seguinte.
+    """
+
+    def __init__(self):
+        self.previous = None
+        self.copy = None
+        self.buffers = FrameBuffers()
+
+    def reset(self):
+        self.previous = None
+
+    def _keep(self, image, owned):
+        if owned:
+            return image
+        if self.copy is None or self.copy.shape != image.shape:
+            self.copy = np.empty_like(image)
+        np.copyto(self.copy, image)
+        return self.copy
+
+    def process(self, state):
+        current = state.image
+        if self.previous is None or self.previous.shape != current.shape:
+            self.previous = self._keep(current, state.owned)
+            state.skip = True
+            return
+        dst = self.buffers.next(current.shape)
+        state.image = cv2.absdiff(self.previous, current, dst=dst)
+        self.previous = self._keep(current, state.owned)
+        state.owned = True
+
+
+class ThresholdStage:
+    """Binariza a diferença: pixels que mudaram mais que o limiar"""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.buffers = FrameBuffers()
+
+    def process(self, state):
+        # No lugar sobre a diferença, que não é usada depois
+        dst = state.image if state.owned else self.buffers.next(state.image.shape)
+        state.image = cv2.threshold(state.image, self.threshold, 255, cv2.THRESH_BINARY, dst=dst)[1]
+        state.owned = True
+
+
+class DilateStage:
+    """Dilata a máscara para preencher buracos nas regiões em movimento"""
+
+    def __init__(self, iterations):
+        self.iterations = iterations
+        self.buffers = FrameBuffers()
+
+    def process(self, state):
+        dst = self.buffers.next(state.image.shape)
+        state.image = cv2.dilate(state.image, None, dst=dst, iterations=self.iterations)
+        state.owned = True
+
+
+class ComponentStage:
+    """Mede as regiões em movimento e compara a maior com a área mínima
+
+    countNonZero descarta rapidamente frames com menos pixels alterados que a
+    área mínima (nenhuma região pode ser maior que o total); só nos demais
+    connectedComponentsWithStats calcula área e retângulo de cada região.
+    """
+
+    def __init__(self, min_area):
+        self.min_area = min_area
+        self.labels = None
+
+    def process(self, state):
+        state.changed_pixels = cv2.countNonZero(state.image)
+        if state.changed_pixels <= self.min_area:
+            return
+
+        if self.labels is None or self.labels.shape != state.image.shape:
+            self.labels = np.empty(state.image.shape, dtype=np.int32)
+        # BBDT: custo proporcional aos pixels, mesmo com centenas de regiões (ruído)
+        count, _, stats, _ = cv2.connectedComponentsWithStatsWithAlgorithm(
+            state.image, 8, cv2.CV_32S, cv2.CCL_BBDT, labels=self.labels
+        )
+        state.regions = count - 1
+        largest = 1 + int(stats[1:, cv2.CC_STAT_AREA].argmax())
+        x, y, w, h, area = stats[largest]
+        state.largest_area = int(area)
+        state.bbox = state.source_bbox(x, y, w, h)
+        state.motion = state.largest_area > self.min_area
+
+
+class MotionPipeline:
+    """Pipeline de detecção de movimento com estágios substituíveis
+
+    Cada estágio recebe o FrameState e altera state.image; um estágio pode
+    marcar state.skip para interromper o frame (ex.: sem frame anterior).
+    Sem estágios explícitos, o pipeline padrão é montado no primeiro frame
+    com os parâmetros convertidos para a resolução de trabalho.
+    """
+
+    # Tipo de dado que a fonte de frames deve entregar
+    input_kind = 'frames'
+
+    def __init__(self, params=None, stages=None):
+        self.params = params or DetectionParams()
+        self.custom_stages = stages is not None
+        self.stages = stages if stages is not None else []
+        self.working_params = self.params
+        self.source_size = None
+
+    def configure(self, source_size):
+        """Monta os estágios padrão para frames de source_size (largura, altura)"""
+        self.source_size = source_size
+        width = self.params.working_width
+        scale = width / source_size[0] if width and source_size[0] > width else 1
+        self.working_params = self.params.scaled(scale)
+        self.stages = self.default_stages(self.working_params)
+
+    @staticmethod
+    def default_stages(params):
+        region = RegionMask(params.masks)
+        stages = [
+            ResizeStage(params.working_width),
+            GrayscaleStage(),
+        ]
+        if region:
+            stages.append(CropStage(region))
+        stages += [
+            BlurStage(params.blur_size),
+            FrameDiffStage(),
+        ]
+        if region:
+            stages.append(MaskStage())
+        stages += [
+            ThresholdStage(params.pixel_threshold),
+            DilateStage(params.dilate_iterations),
+            ComponentStage(params.min_area),
+        ]
+        return stages
+
+    @classmethod
+    def for_camera(cls, camera):
+        return cls(DetectionParams.from_camera(camera))
+
+    def reset(self):
+        """Descarta o estado entre frames (ex.: após reconectar ao stream)"""
+        for stage in self.stages:
+            if hasattr(stage, 'reset'):
+                stage.reset()
+
+    def process(self, frame, source_size=None):
+        """Processa um frame (BGR ou cinza) e retorna o FrameState com o resultado
+
+        source_size é a resolução original do stream quando o frame já chega
+        reduzido (ex.: FFmpegFrameSource); por padrão é o tamanho do frame.
+        """
+        frame_size = (frame.shape[1], frame.shape[0])
+        source_size = source_size or frame_size
+        if not self.custom_stages and source_size != self.source_size:
+            self.configure(source_size)
+
+        state = FrameState(frame)
+        state.source_size = source_size
+        state.scale = frame_size[0] / source_size[0]
+        for stage in self.stages:
+            stage.process(state)
+            if state.skip:
+                break
+        return state
+
+
+# Abertura 3x3 na grade: regiões menores que 3x3 células são descartadas
+OPENING_KERNEL = np.ones((3, 3), dtype=np.uint8)
+
+
+class MotionVectorPipeline:
+    """Detecção a partir dos vetores de movimento exportados pelo decodificador
+
+    O codificador H.264 já calculou para onde cada bloco se moveu; aqui os
+    vetores (MotionVectorFrameSource) são somados em uma grade de células e
+    as células com deslocamento suficiente são agrupadas em regiões. Nenhum
+    pixel é analisado, então o custo por frame é uma fração da diferença
+    entre frames. min_area é comparada na resolução original do stream.
+    """
+
+    input_kind = 'motion_vectors'
+
+    def __init__(self, params=None, cell_size=16, min_magnitude=2.0, min_coverage=0.5):
+        self.params = params or DetectionParams(method='motion_vectors')
+        # Lado de cada célula da grade (pixels do stream; um macrobloco H.264)
+        self.cell_size = cell_size
+        # Deslocamento mínimo de um bloco, em pixels, para contar como movimento
+        self.min_magnitude = min_magnitude
+        # Fração da célula coberta por blocos em movimento para marcá-la
+        self.min_coverage = min_coverage
+        self.region = RegionMask(self.params.masks)
+        self.working_params = self.params
+
+    @classmethod
+    def for_camera(cls, camera):
+        return cls(DetectionParams.from_camera(camera))
+
+    def reset(self):
+        """Sem estado entre frames: cada frame traz seus próprios vetores"""
+
+    def process(self, vectors, source_size=None):
+        """Processa os vetores de um frame e retorna o FrameState com o resultado
+
+        vectors é None em frames sem vetores (quadros I), que são ignorados.
+        """
+        state = FrameState(vectors)
+        state.source_size = source_size
+        if vectors is None or source_size is None:
+            state.skip = True
+            return state
+        if len(vectors) == 0:
+            return state
+
+        magnitude = np.hypot(vectors['motion_x'], vectors['motion_y']) / np.maximum(vectors['motion_scale'], 1)
+        mask = magnitude >= self.min_magnitude
+        if not mask.any():
+            return state
+        moving = vectors[mask]
+        state.magnitude = float(magnitude[mask].mean())
+
+        # Área em movimento por célula, usando o centro de cada bloco no frame atual
+        cols = -(-source_size[0] // self.cell_size)
+        rows = -(-source_size[1] // self.cell_size)
+        x = np.clip(moving['dst_x'] // self.cell_size, 0, cols - 1)
+        y = np.clip(moving['dst_y'] // self.cell_size, 0, rows - 1)
+        coverage = np.bincount(
+            y.astype(np.int64) * cols + x,
+            weights=moving['w'].astype(np.float32) * moving['h'],
+            minlength=rows * cols,
+        ).reshape(rows, cols)
+        cells = (coverage >= self.cell_size * self.cell_size * self.min_coverage).astype(np.uint8)
+        if self.region:
+            # A máscara rasterizada na resolução da grade: uma célula por pixel
+            cells &= self.region.get(cols, rows)[0] // 255
+        # Vetores espúrios do codificador aparecem como células isoladas
+        cells = cv2.morphologyEx(cells, cv2.MORPH_OPEN, OPENING_KERNEL)
+
+        cell_area = self.cell_size * self.cell_size
+        state.changed_pixels = cv2.countNonZero(cells) * cell_area
+        if state.changed_pixels <= self.params.min_area:
+            return state
+
+        count, _, stats, _ = cv2.connectedComponentsWithStats(cells, connectivity=8)
+        state.regions = count - 1
+        largest = 1 + int(stats[1:, cv2.CC_STAT_AREA].argmax())
+        x, y, w, h, cells_count = (int(value) for value in stats[largest])
+        state.largest_area = cells_count * cell_area
+        state.bbox = (x * self.cell_size, y * self.cell_size, w * self.cell_size, h * self.cell_size)
+        state.motion = state.largest_area > self.params.min_area
+        return state
+
+
+def create_pipeline(camera):
+    """Pipeline de detecção conforme o método configurado na câmera"""
+    params = DetectionParams.from_camera(camera)
+    if params.method == 'motion_vectors':
+        from .frame_sources import av
+        if av is not None:
+            return MotionVectorPipeline(params)
+        print(f"⚠️ PyAV não instalado; câmera {camera.name} usará diferença entre frames")
+    return MotionPipeline(params)
+
+
+class MotionMetrics:
+    """Intensidade do movimento ao longo de um incidente
+
+    Acumula, por frame analisado, a fração de pixels alterados (pico e
+    média), a maior região com seu retângulo e quantos frames tiveram
+    movimento. A confiança é a fração de frames com movimento entre o
+    primeiro e o último deles, ignorando o silêncio que encerra o incidente.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.motion_frames = 0
+        # Frames analisados até o último com movimento
+        self.active_frames = 0
+        self.peak_ratio = 0.0
+        self.ratio_sum = 0.0
+        self.largest_area = 0
+        self.bbox = None
+
+    def add(self, state):
+        if state.skip:
+            return
+        ratio = state.changed_ratio()
+        self.frames += 1
+        self.ratio_sum += ratio
+        self.peak_ratio = max(self.peak_ratio, ratio)
+        if state.motion:
+            self.motion_frames += 1
+            self.active_frames = self.frames
+            area = state.source_area()
+            if area > self.largest_area:
+                self.largest_area = area
+                self.bbox = state.bbox
+
+    @property
+    def mean_ratio(self):
+        return self.ratio_sum / self.frames if self.frames else 0.0
+
+    @property
+    def confidence(self):
+        return self.motion_frames / self.active_frames if self.active_frames else 0.0
+
+    @property
+    def quiet_frames(self):
+        """Frames analisados depois do último com movimento"""
+        return self.frames - self.active_frames
+
+    def is_weak(self, min_peak_ratio=0.0, min_confidence=0.0):
+        """Se o movimento é fraco demais para virar gravação"""
+        return self.peak_ratio < min_peak_ratio or self.confidence < min_confidence
+
+    def to_dict(self):
+        """Campos do MotionEvent correspondentes"""
+        return {
+            'confidence': round(self.confidence, 3),
+            'peak_ratio': round(self.peak_ratio, 5),
+            'mean_ratio': round(self.mean_ratio, 5),
+            'area_affected': self.largest_area,
+            'bbox': list(self.bbox) if self.bbox else None,
+            'trigger_frames': self.motion_frames,
+        }
+
+
+class MotionTrigger:
+    """Confirma movimento após min_motion_frames frames consecutivos
+
+    Opcionalmente aplica um intervalo mínimo (cooldown) entre confirmações.
+    """
+
+    def __init__(self, min_motion_frames=2, cooldown=0):
+        self.min_motion_frames = min_motion_frames
+        self.cooldown = cooldown
+        self.motion_frames = 0
+        self.last_trigger = 0
+
+    def update(self, motion):
+        """Retorna 'confirmed', 'cooldown' (confirmado dentro do intervalo) ou None"""
+        if not motion:
+            self.motion_frames = 0
+            return None
+
+        self.motion_frames += 1
+        if self.motion_frames < self.min_motion_frames:
+            return None
+
+        self.motion_frames = 0
+        current_time = time.time()
+        if current_time - self.last_trigger < self.cooldown:
+            return 'cooldown'
+        self.last_trigger = current_time
+        return 'confirmed'
+
+    def remaining_cooldown(self):
+        return max(0, self.cooldown - (time.time() - self.last_trigger))
+
+
+class AdaptiveSampler:
+    """Taxa de análise que acompanha a atividade da cena
+
+    Após idle_after segundos sem suspeita de movimento a câmera passa a ser
+    analisada a idle_fps. Basta um frame com pixels alterados acima de
+    suspect_ratio da área mínima para voltar na hora a active_fps (0 = todos
+    os frames da fonte). Os frames fora da taxa são descartados pela fonte
+    sem passar pelo pipeline.
+    """
+
+    def __init__(self, active_fps=10, idle_fps=1, idle_after=30, suspect_ratio=0.5):
+        self.active_fps = active_fps
+        self.idle_fps = idle_fps
+        self.idle_after = idle_after
+        self.suspect_ratio = suspect_ratio
+        self.idle = False
+        self.last_activity = time.time()
+        self.next_analysis = 0
+
+    @classmethod
+    def from_settings(cls):
+        dvr_settings = settings.DVR_SETTINGS
+        return cls(
+            active_fps=dvr_settings.get('DETECTION_ACTIVE_FPS', 10),
+            idle_fps=dvr_settings.get('DETECTION_IDLE_FPS', 1),
+            idle_after=dvr_settings.get('DETECTION_IDLE_AFTER', 30),
+        )
+
+    @property
+    def current_fps(self):
+        return self.idle_fps if self.idle else self.active_fps
+
+    @property
+    def mode(self):
+        return 'idle' if self.idle else 'active'
+
+    def should_analyse(self, now=None):
+        """Se o próximo frame deve passar pelo pipeline"""
+        return (now or time.time()) >= self.next_analysis
+
+    def update(self, state, min_area, now=None):
+        """Registra o resultado de uma análise; retorna True se o modo mudou"""
+        now = now or time.time()
+        was_idle = self.idle
+        if state.motion or state.source_changed_pixels() >= min_area * self.suspect_ratio:
+            self.last_activity = now
+            self.idle = False
+        elif now - self.last_activity >= self.idle_after:
+            self.idle = True
+
+        fps = self.current_fps
+        self.next_analysis = now + 1.0 / fps if fps > 0 else 0
+        return self.idle != was_idle
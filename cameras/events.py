@@ -0,0 +1,203 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+from django.conf import settings
+from django.utils import timezone
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+# Canal Redis compartilhado por todos os processos (web, Celery, comandos)
+EVENTS_CHANNEL = 'dvr:events'
+
+# Intervalo entre comentários de keep-alive no SSE (segundos)
+HEARTBEAT_INTERVAL = 15
+
+# Eventos pendentes por conexão antes de descartar os mais novos
+LISTENER_QUEUE_SIZE = 100
+
+
+class EventBus:
+    """Canal de eventos em tempo real: status de câmeras, gravações e movimento
+
+    Com Redis os eventos atravessam processos via pub/sub, então o verificador
+    de status e os gravadores notificam os navegadores conectados ao servidor
+    web. Sem Redis os eventos ficam restritos ao processo atual.
+    """
+
+    def __init__(self):
+        self.listeners = set()
+        self.lock = threading.Lock()
+        self.listener_thread = None
+        self.redis = None
+        self.redis_retry_at = 0
+
+    def _get_redis(self):
+        """Cliente Redis ou None (nova tentativa a cada 30 segundos após falha)"""
+        if redis is None:
+            return None
+        if self.redis is not None:
+            return self.redis
+        if time.time() < self.redis_retry_at:
+            return None
+
+        try:
+            client = redis.Redis.from_url(
+                settings.DVR_SETTINGS['EVENTS_REDIS_URL'],
+                socket_connect_timeout=1,
+                socket_timeout=5,
+            )
+            client.ping()
+            self.redis = client
+        except Exception as e:
+            print(f"⚠️ Redis indisponível para eventos, usando apenas o processo local: {e}")
+            self.redis_retry_at = time.time() + 30
+        return self.redis
+
+    def _redis_failed(self, error):
+        print(f"⚠️ Erro no Redis de eventos: {error}")
+        self.redis = None
+        self.redis_retry_at = time.time() + 30
+
+    def publish(self, event_type, camera_id=None, **data):
+        """Publica um evento para todas as conexões SSE"""
+        event = {
+            'type': event_type,
+            'camera_id': str(camera_id) if camera_id else None,
+            'timestamp': timezone.now().isoformat(),
+        }
+        event.update(data)
+        message = json.dumps(event, default=str)
+
+        client = self._get_redis()
+        if client is not None:
+            try:
+                client.publish(EVENTS_CHANNEL, message)
+                return
+            except Exception as e:
+                self._redis_failed(e)
+
+        self._dispatch(message)
+
+    def _dispatch(self, message):
+        with self.lock:
+            listeners = list(self.listeners)
+        for deliver in listeners:
+            deliver(message)
+
+    def subscribe(self, deliver):
+        """Registra uma função que recebe cada evento (JSON) publicado"""
+        with self.lock:
+            self.listeners.add(deliver)
+            if self.listener_thread is None:
+                self.listener_thread = threading.Thread(target=self._listen, daemon=True)
+                self.listener_thread.start()
+
+    def unsubscribe(self, deliver):
+        with self.lock:
+            self.listeners.discard(deliver)
+
+    def _has_listeners(self):
+        with self.lock:
+            if not self.listeners:
+                self.listener_thread = None
+                return False
+            return True
+
+    def _listen(self):
+        """Repassa os eventos do Redis às conexões deste processo enquanto houver alguma"""
+        while self._has_listeners():
+            client = self._get_redis()
+            if client is None:
+                time.sleep(1)
+                continue
+
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(EVENTS_CHANNEL)
+                try:
+                    while self._has_listeners():
+                        message = pubsub.get_message(timeout=1.0)
+                        if message is not None:
+                            self._dispatch(message['data'].decode())
+                finally:
+                    pubsub.close()
+            except Exception as e:
+                self._redis_failed(e)
+
+
+def format_sse(message, camera_id=None):
+    """Formata um evento para SSE, ou None se for de outra câmera"""
+    event = json.loads(message)
+    if camera_id and event.get('camera_id') != str(camera_id):
+        return None
+    return f"event: {event['type']}\ndata: {message}\n\n"
+
+
+def event_stream(camera_id=None):
+    """Gerador SSE síncrono (uma thread por conexão)"""
+    messages = queue.Queue(maxsize=LISTENER_QUEUE_SIZE)
+
+    def deliver(message):
+        try:
+            messages.put_nowait(message)
+        except queue.Full:
+            pass
+
+    event_bus.subscribe(deliver)
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                message = messages.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                yield ': ping\n\n'
+                continue
+            chunk = format_sse(message, camera_id)
+            if chunk:
+                yield chunk
+    finally:
+        event_bus.unsubscribe(deliver)
+
+
+async def async_event_stream(camera_id=None):
+    """Versão assíncrona de event_stream (uma corrotina por conexão)"""
+    loop = asyncio.get_running_loop()
+    messages = asyncio.Queue(maxsize=LISTENER_QUEUE_SIZE)
+
+    def put(message):
+        try:
+            messages.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+    def deliver(message):
+        try:
+            loop.call_soon_threadsafe(put, message)
+        except RuntimeError:
+            # Event loop já encerrado
+            event_bus.unsubscribe(deliver)
+
+    event_bus.subscribe(deliver)
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                message = await asyncio.wait_for(messages.get(), timeout=HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            chunk = format_sse(message, camera_id)
+            if chunk:
+                yield chunk
+    finally:
+        event_bus.unsubscribe(deliver)
+
+
+# Instância global do canal de eventos
+event_bus = EventBus()
@@ -1,5 +1,5 @@
 from django import forms
-from .models import Camera, CameraSettings
+from .models import Camera, CameraSettings, CameraMask
 import re
 
 
@@ -10,7 +10,7 @@ class CameraForm(forms.ModelForm):
         model = Camera
         fields = [
             'name', 'description', 'ip_address', 'port', 'stream_url',
-            'camera_type', 'username', 'password', 'motion_detection_enabled',
+            'substream_url', 'camera_type', 'username', 'password', 'motion_detection_enabled',
             'recording_enabled', 'is_active'
         ]
         widgets = {
@@ -19,6 +19,7 @@ class CameraForm(forms.ModelForm):
             'ip_address': forms.TextInput(attrs={'class': 'form-control'}),
             'port': forms.NumberInput(attrs={'class': 'form-control'}),
             'stream_url': forms.TextInput(attrs={'class': 'form-control'}),  # Mudado de URLInput para TextInput
+            'substream_url': forms.TextInput(attrs={'class': 'form-control'}),
             'camera_type': forms.Select(attrs={'class': 'form-control'}),
             'username': forms.TextInput(attrs={'class': 'form-control'}),
             'password': forms.PasswordInput(attrs={'class': 'form-control'}),
@@ -27,22 +28,30 @@ class CameraForm(forms.ModelForm):
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
     
+    # Permitir URLs RTSP, HTTP, HTTPS e outras URLs válidas
+    URL_PATTERN = re.compile(
+        r'^(https?|rtsp)://'  # http://, https:// ou rtsp://
+        r'([\w\-]+\.)*[\w\-]+'  # domínio ou IP
+        r'(:\d+)?'  # porta opcional
+        r'(/.*)?$',  # caminho opcional
+        re.IGNORECASE
+    )
+    
     def clean_stream_url(self):
         """Validação da URL do stream"""
         url = self.cleaned_data['stream_url']
         if not url:
             raise forms.ValidationError('URL do stream é obrigatória.')
         
-        # Permitir URLs RTSP, HTTP, HTTPS e outras URLs válidas
-        url_pattern = re.compile(
-            r'^(https?|rtsp)://'  # http://, https:// ou rtsp://
-            r'([\w\-]+\.)*[\w\-]+'  # domínio ou IP
-            r'(:\d+)?'  # porta opcional
-            r'(/.*)?$',  # caminho opcional
-            re.IGNORECASE
-        )
+        if not self.URL_PATTERN.match(url):
+            raise forms.ValidationError('Digite uma URL válida (HTTP, HTTPS ou RTSP).')
         
-        if not url_pattern.match(url):
+        return url
+    
+    def clean_substream_url(self):
+        """Validação da URL do substream (opcional)"""
+        url = self.cleaned_data['substream_url']
+        if url and not self.URL_PATTERN.match(url):
             raise forms.ValidationError('Digite uma URL válida (HTTP, HTTPS ou RTSP).')
         
         return url
@@ -70,7 +79,10 @@ class CameraSettingsForm(forms.ModelForm):
         fields = [
             'motion_sensitivity', 'recording_quality', 'frame_rate',
             'resolution_width', 'resolution_height', 'recording_duration',
-            'motion_timeout', 'motion_start_delay'
+            'motion_timeout', 'motion_start_delay', 'live_view_stream',
+            'detection_stream', 'snapshot_stream', 'motion_pixel_threshold',
+            'motion_min_area', 'motion_min_frames', 'motion_blur_size',
+            'detection_width', 'detection_method'
         ]
         widgets = {
             'motion_sensitivity': forms.NumberInput(
@@ -98,8 +110,55 @@ class CameraSettingsForm(forms.ModelForm):
             'motion_start_delay': forms.NumberInput(
                 attrs={'class': 'form-control', 'min': '1', 'max': '60'}
             ),
+            'live_view_stream': forms.Select(attrs={'class': 'form-control'}),
+            'detection_stream': forms.Select(attrs={'class': 'form-control'}),
+            'snapshot_stream': forms.Select(attrs={'class': 'form-control'}),
+            'motion_pixel_threshold': forms.NumberInput(
+                attrs={'class': 'form-control', 'min': '1', 'max': '255'}
+            ),
+            'motion_min_area': forms.NumberInput(
+                attrs={'class': 'form-control', 'min': '1'}
+            ),
+            'motion_min_frames': forms.NumberInput(
+                attrs={'class': 'form-control', 'min': '1', 'max': '30'}
+            ),
+            'motion_blur_size': forms.NumberInput(
+                attrs={'class': 'form-control', 'min': '1', 'max': '51', 'step': '2'}
+            ),
+            'detection_width': forms.NumberInput(
+                attrs={'class': 'form-control', 'min': '0', 'max': '3840', 'step': '16'}
+            ),
+            'detection_method': forms.Select(attrs={'class': 'form-control'}),
         }
     
+    def clean_motion_pixel_threshold(self):
+        """Validação do limiar de diferença de pixel"""
+        threshold = self.cleaned_data['motion_pixel_threshold']
+        if threshold < 1 or threshold > 255:
+            raise forms.ValidationError('O limiar deve estar entre 1 e 255.')
+        return threshold
+    
+    def clean_motion_min_area(self):
+        """Validação da área mínima de movimento"""
+        min_area = self.cleaned_data['motion_min_area']
+        if min_area < 1:
+            raise forms.ValidationError('A área mínima deve ser de pelo menos 1 pixel.')
+        return min_area
+    
+    def clean_motion_blur_size(self):
+        """Validação do tamanho do desfoque (kernel ímpar)"""
+        blur_size = self.cleaned_data['motion_blur_size']
+        if blur_size < 1 or blur_size > 51 or blur_size % 2 == 0:
+            raise forms.ValidationError('O desfoque deve ser um número ímpar entre 1 e 51.')
+        return blur_size
+    
+    def clean_detection_width(self):
+        """Validação da largura de processamento (0 = resolução original)"""
+        width = self.cleaned_data['detection_width']
+        if width != 0 and (width < 160 or width > 3840):
+            raise forms.ValidationError('A largura deve ser 0 (original) ou estar entre 160 e 3840.')
+        return width
+    
     def clean_motion_sensitivity(self):
         """Validação da sensibilidade de movimento"""
         sensitivity = self.cleaned_data['motion_sensitivity']
@@ -119,4 +178,34 @@ class CameraSettingsForm(forms.ModelForm):
         duration = self.cleaned_data['recording_duration']
         if duration < 10 or duration > 300:
             raise forms.ValidationError('A duração da gravação deve estar entre 10 e 300 segundos.')
-        return duration 
\ No newline at end of file
+        return duration 
+
+class CameraMaskForm(forms.ModelForm):
+    """Formulário para máscaras de detecção desenhadas sobre o snapshot"""
+    
+    class Meta:
+        model = CameraMask
+        fields = ['name', 'mask_type', 'points']
+        widgets = {
+            'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ex: Árvore, Rua, Data/hora'}),
+            'mask_type': forms.Select(attrs={'class': 'form-control'}),
+            'points': forms.HiddenInput(),
+        }
+    
+    def clean_points(self):
+        """Validação do polígono: ao menos 3 vértices normalizados entre 0 e 1"""
+        points = self.cleaned_data['points']
+        if not isinstance(points, list) or len(points) < 3:
+            raise forms.ValidationError('Desenhe um polígono com pelo menos 3 pontos.')
+        cleaned = []
+        for point in points:
+            if not isinstance(point, (list, tuple)) or len(point) != 2:
+                raise forms.ValidationError('Pontos inválidos.')
+            try:
+                x, y = float(point[0]), float(point[1])
+            except (TypeError, ValueError):
+                raise forms.ValidationError('Pontos inválidos.')
+            if not (0 <= x <= 1 and 0 <= y <= 1):
+                raise forms.ValidationError('Os pontos devem estar dentro da imagem.')
+            cleaned.append([round(x, 4), round(y, 4)])
+        return cleaned
@@ -0,0 +1,296 @@
+import collections
+import cv2
+import numpy as np
+import re
+import subprocess
+import threading
+from django.conf import settings
+
+try:
+    import av
+except ImportError:
+    av = None
+
+
+# Codecs cujos decodificadores do ffmpeg exportam vetores de movimento
+MOTION_VECTOR_CODECS = ('h264', 'mpeg4', 'mpeg2video', 'mpeg1video', 'h263')
+
+# Tamanho de vídeo nas linhas "Stream #0:0: Video: ..., 1920x1080 ..." do ffmpeg
+STREAM_SIZE_RE = re.compile(r'Stream #\d+:\d+.*?: Video: .*?(\d{2,5})x(\d{2,5})')
+
+
+class OpenCVFrameSource:
+    """Frames BGR em resolução original via cv2.VideoCapture
+
+    Decodifica todos os frames do stream; quem lê escolhe quais converter
+    (read) e quais apenas avançar (skip). O array entregue por read() é
+    reaproveitado na leitura seguinte.
+    """
+
+    # Os frames chegam tão rápido quanto o stream permite
+    paced = False
+
+    def __init__(self, stream_url):
+        self.stream_url = stream_url
+        self.cap = None
+        self.source_size = None
+        self.frame = None
+
+    def open(self):
+        # Timeouts só valem se passados na abertura; set() depois não tem efeito
+        self.cap = cv2.VideoCapture(self.stream_url, cv2.CAP_FFMPEG, [
+            cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, 5000,
+            cv2.CAP_PROP_READ_TIMEOUT_MSEC, 3000,
+        ])
+        return self.cap.isOpened()
+
+    def read(self):
+        # Com um array do mesmo formato o OpenCV decodifica direto nele
+        ret, frame = self.cap.read(self.frame)
+        if ret:
+            self.frame = frame
+            self.source_size = (frame.shape[1], frame.shape[0])
+        return ret, frame
+
+    def skip(self):
+        """Avança um frame sem convertê-lo para BGR"""
+        return self.cap.grab()
+
+    def interrupt(self):
+        """Não é seguro liberar o VideoCapture durante um read() de outra thread
+
+        A leitura travada termina em até 3s pelo CAP_PROP_READ_TIMEOUT_MSEC
+        passado na abertura.
+        """
+        return False
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class FFmpegFrameSource:
+    """Frames em escala de cinza, já reduzidos e na taxa de detecção, via ffmpeg
+
+    O ffmpeg aplica fps=N,scale=W:-2,format=gray e escreve rawvideo no stdout;
+    cada frame tem tamanho fixo e é lido direto para um array numpy. Assim a
+    conversão de cor, o redimensionamento e o descarte de frames acontecem no
+    ffmpeg e o Python recebe apenas os frames que a detecção usa. O array
+    entregue por read() é reaproveitado na leitura seguinte.
+    """
+
+    # O ffmpeg entrega os frames na taxa configurada
+    paced = True
+
+    def __init__(self, stream_url, fps=5, width=320):
+        self.stream_url = stream_url
+        self.fps = fps
+        self.width = width
+        self.process = None
+        self.source_size = None
+        self.frame_size = None
+        self.stderr_tail = collections.deque(maxlen=20)
+        self.header_ready = None
+        self.frame = None
+        self.discard = None
+
+    def build_command(self):
+        """Monta o comando ffmpeg que gera frames cinza crus no stdout"""
+        filters = [f'fps={self.fps}']
+        if self.width:
+            # Nunca amplia frames menores que a largura de trabalho; altura par
+            filters.append(f"scale='min({self.width},iw)':-2")
+        filters.append('format=gray')
+
+        cmd = ['ffmpeg', '-hide_banner', '-nostats', '-loglevel', 'info']
+        if self.stream_url.startswith('rtsp://'):
+            # nobuffer reduz a latência ao vivo (em arquivos impede a decodificação)
+            cmd += ['-rtsp_transport', 'tcp', '-fflags', 'nobuffer']
+        cmd += [
+            '-i', self.stream_url,
+            '-an', '-sn',
+            '-vf', ','.join(filters),
+            '-pix_fmt', 'gray',
+            '-f', 'rawvideo',
+            'pipe:1',
+        ]
+        return cmd
+
+    def _read_stderr(self, process, header_ready):
+        """Extrai as resoluções de entrada e saída do cabeçalho e drena o stderr"""
+        section = None
+        for raw_line in process.stderr:
+            line = raw_line.decode(errors='replace').strip()
+            self.stderr_tail.append(line)
+            if line.startswith('Input #'):
+                section = 'input'
+            elif line.startswith('Output #'):
+                section = 'output'
+
+            match = STREAM_SIZE_RE.search(line)
+            if match:
+                size = (int(match.group(1)), int(match.group(2)))
+                if section == 'input' and self.source_size is None:
+                    self.source_size = size
+                elif section == 'output' and self.frame_size is None:
+                    self.frame_size = size
+                    header_ready.set()
+        process.stderr.close()
+        header_ready.set()
+
+    def open(self, timeout=15):
+        """Inicia o ffmpeg e aguarda a resolução dos frames de saída"""
+        self.source_size = None
+        self.frame_size = None
+        self.header_ready = threading.Event()
+        self.process = subprocess.Popen(
+            self.build_command(),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
+        )
+        threading.Thread(
+            target=self._read_stderr,
+            args=(self.process, self.header_ready),
+            daemon=True,
+        ).start()
+
+        if not self.header_ready.wait(timeout) or self.frame_size is None:
+            error = self.stderr_tail[-1] if self.stderr_tail else 'sem resposta'
+            print(f"❌ ffmpeg não abriu o stream {self.stream_url}: {error}")
+            self.release()
+            return False
+        if self.source_size is None:
+            self.source_size = self.frame_size
+        return True
+
+    def _fill(self, view):
+        """Preenche view com exatamente len(view) bytes do stdout"""
+        received = 0
+        while received < len(view):
+            count = self.process.stdout.readinto(view[received:])
+            if not count:
+                return False
+            received += count
+        return True
+
+    def read(self):
+        """Lê exatamente um frame (altura x largura bytes) do stdout"""
+        width, height = self.frame_size
+        if self.frame is None or self.frame.shape != (height, width):
+            self.frame = np.empty((height, width), dtype=np.uint8)
+        if not self._fill(memoryview(self.frame).cast('B')):
+            return False, None
+        return True, self.frame
+
+    def skip(self):
+        """Consome um frame do pipe sem alocar um array novo"""
+        width, height = self.frame_size
+        if self.discard is None or len(self.discard) != width * height:
+            self.discard = bytearray(width * height)
+        return self._fill(memoryview(self.discard))
+
+    def interrupt(self):
+        """Mata o ffmpeg de outra thread; a leitura em curso recebe EOF"""
+        process = self.process
+        if process is None or process.poll() is not None:
+            return False
+        process.kill()
+        return True
+
+    def release(self):
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process.stdout.close()
+        self.process = None
+
+
+class MotionVectorFrameSource:
+    """Vetores de movimento de cada frame, exportados pelo decodificador (PyAV)
+
+    O decodificador roda com flags2=+export_mvs e nenhum frame é convertido
+    para numpy: read() entrega apenas o array de vetores (source, w, h,
+    src_x/y, dst_x/y, motion_x/y, motion_scale) ou None em quadros I.
+    Todos os frames são lidos, pois cada vetor é relativo ao frame anterior.
+    """
+
+    paced = True
+
+    def __init__(self, stream_url):
+        self.stream_url = stream_url
+        self.container = None
+        self.frames = None
+        self.source_size = None
+
+    def open(self):
+        options = {'rtsp_transport': 'tcp'} if self.stream_url.startswith('rtsp://') else {}
+        try:
+            self.container = av.open(self.stream_url, options=options, timeout=(5, 5))
+            stream = self.container.streams.video[0]
+        except (av.error.FFmpegError, IndexError) as e:
+            print(f"❌ Não foi possível abrir {self.stream_url} para vetores de movimento: {e}")
+            self.release()
+            return False
+
+        codec = stream.codec_context
+        if codec.name not in MOTION_VECTOR_CODECS:
+            print(f"❌ Codec {codec.name} não exporta vetores de movimento ({self.stream_url})")
+            self.release()
+            return False
+
+        codec.options = {'flags2': '+export_mvs'}
+        self.source_size = (codec.width, codec.height)
+        self.frames = self.container.decode(stream)
+        return True
+
+    def read(self):
+        try:
+            frame = next(self.frames)
+        except (StopIteration, av.error.FFmpegError):
+            return False, None
+        vectors = frame.side_data.get('MOTION_VECTORS')
+        return True, vectors.to_ndarray() if vectors is not None else None
+
+    def skip(self):
+        """Decodifica um frame sem copiar seus vetores"""
+        try:
+            next(self.frames)
+        except (StopIteration, av.error.FFmpegError):
+            return False
+        return True
+
+    def interrupt(self):
+        """A leitura travada termina pelo timeout de leitura do av.open()"""
+        return False
+
+    def release(self):
+        if self.container is not None:
+            self.container.close()
+            self.container = None
+        self.frames = None
+
+
+def create_frame_source(camera, pipeline):
+    """Fonte de frames adequada ao pipeline da câmera
+
+    Pipelines de vetores de movimento recebem vetores do PyAV; os demais
+    recebem frames conforme DETECTION_DECODER ('opencv' ou 'ffmpeg').
+    """
+    stream_url = camera.get_stream_url(camera.get_stream_for('detection'))
+    if pipeline.input_kind == 'motion_vectors':
+        return MotionVectorFrameSource(stream_url)
+    if settings.DVR_SETTINGS.get('DETECTION_DECODER', 'opencv') == 'ffmpeg':
+        return FFmpegFrameSource(
+            stream_url,
+            fps=settings.DVR_SETTINGS.get('DETECTION_FPS', 5),
+            width=pipeline.params.working_width,
+        )
+    return OpenCVFrameSource(stream_url)
@@ -0,0 +1,189 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from django.conf import settings
+
+
+def get_hls_root():
+    """Diretório base dos segmentos HLS (tmpfs quando disponível)"""
+    path = settings.DVR_SETTINGS.get('HLS_PATH')
+    if not path:
+        base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        path = os.path.join(base, 'dvr_hls')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class HLSSession:
+    """Remux do stream da câmera para HLS com ffmpeg (-c copy, sem transcodificação)"""
+
+    PLAYLIST_NAME = 'index.m3u8'
+
+    def __init__(self, camera_id, stream_url):
+        self.camera_id = camera_id
+        self.stream_url = stream_url
+        # Diretório próprio da sessão: uma sessão nova da mesma câmera não perde
+        # os segmentos para o stop() da anterior
+        self.output_dir = tempfile.mkdtemp(prefix=f'{camera_id}-', dir=get_hls_root())
+        # Início e parada do ffmpeg desta sessão, sem travar as demais câmeras
+        self.lock = threading.Lock()
+        self.process = None
+        self.started_at = 0
+        self.last_access = time.time()
+
+    @property
+    def playlist_path(self):
+        return os.path.join(self.output_dir, self.PLAYLIST_NAME)
+
+    def build_command(self):
+        """Monta o comando ffmpeg que gera a playlist deslizante"""
+        segment_time = settings.DVR_SETTINGS.get('HLS_SEGMENT_TIME', 1)
+        list_size = settings.DVR_SETTINGS.get('HLS_LIST_SIZE', 6)
+
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-fflags', 'nobuffer']
+        if self.stream_url.startswith('rtsp://'):
+            cmd += ['-rtsp_transport', 'tcp']
+        cmd += [
+            '-i', self.stream_url,
+            '-c:v', 'copy',  # Apenas remux: nenhuma decodificação ou codificação
+            '-an',  # Áudio de câmeras (G.711 etc.) não é compatível com HLS
+            '-f', 'hls',
+            '-hls_time', str(segment_time),
+            '-hls_list_size', str(list_size),
+            '-hls_flags', 'delete_segments+independent_segments+omit_endlist',
+            '-hls_segment_filename', os.path.join(self.output_dir, 'seg_%05d.ts'),
+            '-y',
+            self.playlist_path,
+        ]
+        return cmd
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def ensure_started(self):
+        """Inicia o ffmpeg se ele não estiver rodando"""
+        with self.lock:
+            if not self.is_running():
+                self.start()
+
+    def start(self):
+        """Inicia o ffmpeg limpando segmentos de execuções anteriores"""
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        self.process = subprocess.Popen(
+            self.build_command(),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.started_at = time.time()
+        self.last_access = time.time()
+        print(f"🎬 HLS iniciado para câmera {self.camera_id}")
+
+    def stop(self):
+        """Encerra o ffmpeg e remove os segmentos"""
+        with self.lock:
+            if self.process is not None and self.process.poll() is None:
+                self.process.terminate()
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+            self.process = None
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+        print(f"🛑 HLS finalizado para câmera {self.camera_id}")
+
+    def wait_for_playlist(self, timeout=10):
+        """Aguarda a primeira playlist ser escrita pelo ffmpeg"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if os.path.exists(self.playlist_path):
+                return True
+            if not self.is_running():
+                return False
+            time.sleep(0.2)
+        return os.path.exists(self.playlist_path)
+
+    def segment_path(self, segment_name):
+        return os.path.join(self.output_dir, segment_name)
+
+
+class HLSManager:
+    """Mantém uma sessão HLS por câmera enquanto houver visualizadores"""
+
+    def __init__(self):
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.reaper_thread = None
+
+    def get_session(self, camera):
+        """Retorna a sessão HLS da câmera, iniciando o ffmpeg se necessário
+
+        O lock do gerenciador só protege o dicionário de sessões; parar e
+        iniciar o ffmpeg acontece fora dele, para que uma câmera lenta não
+        bloqueie as requisições das outras.
+        """
+        camera_id = str(camera.id)
+        stream_url = camera.get_stream_url(camera.get_stream_for('live_view'))
+        replaced = None
+
+        with self.lock:
+            session = self.sessions.get(camera_id)
+            if session is not None and session.stream_url != stream_url:
+                replaced, session = session, None
+            if session is None:
+                session = HLSSession(camera_id, stream_url)
+                self.sessions[camera_id] = session
+            session.last_access = time.time()
+            self._ensure_reaper()
+
+        if replaced is not None:
+            replaced.stop()
+        session.ensure_started()
+        return session
+
+    def touch(self, camera_id):
+        """Registra acesso a um segmento para manter a sessão viva"""
+        session = self.sessions.get(str(camera_id))
+        if session is not None:
+            session.last_access = time.time()
+        return session
+
+    def _ensure_reaper(self):
+        if self.reaper_thread is None or not self.reaper_thread.is_alive():
+            self.reaper_thread = threading.Thread(target=self._reap_idle_sessions, daemon=True)
+            self.reaper_thread.start()
+
+    def _reap_idle_sessions(self):
+        """Encerra sessões sem acesso há mais de HLS_IDLE_TIMEOUT segundos"""
+        idle_timeout = settings.DVR_SETTINGS.get('HLS_IDLE_TIMEOUT', 30)
+        while True:
+            time.sleep(5)
+            with self.lock:
+                idle = [
+                    self.sessions.pop(camera_id)
+                    for camera_id, session in list(self.sessions.items())
+                    if time.time() - session.last_access > idle_timeout
+                ]
+                finished = not self.sessions
+                if finished:
+                    self.reaper_thread = None
+            for session in idle:
+                session.stop()
+            if finished:
+                return
+
+    def stop_all(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions:
+            session.stop()
+
+
+# Instância global das sessões HLS
+hls_manager = HLSManager()
@@ -72,10 +72,7 @@ class Command(BaseCommand):
         
         # Atualizar status no banco
         if camera.status != status:
-            camera.status = status
-            if status == 'online':
-                camera.last_seen = timezone.now()
-            camera.save()
+            camera.update_status(status)
             self.stdout.write(f'  📝 Status atualizado no banco: {status}')
         else:
             self.stdout.write(f'  ℹ️  Status já estava: {status}')
@@ -1,5 +1,9 @@
+import signal
+import threading
 from django.core.management.base import BaseCommand
+from cameras.daemon import DetectionDaemon
 from cameras.motion_detection import start_motion_detection, stop_motion_detection, get_detection_status
+from cameras.supervisor import detection_supervisor
 
 
 class Command(BaseCommand):
@@ -8,18 +12,41 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument(
             'action',
-            choices=['start', 'stop', 'status'],
-            help='Ação a ser executada: start, stop ou status'
+            choices=['start', 'stop', 'status', 'run'],
+            help=(
+                'Ação a ser executada: start (detecção em primeiro plano até Ctrl+C), '
+                'stop, status ou run (serviço de detecção com concessões entre nós)'
+            )
+        )
+        parser.add_argument(
+            '--node-name',
+            help='Nome do nó de detecção no modo run (padrão: host-pid)'
         )
 
     def handle(self, *args, **options):
         action = options['action']
         
-        if action == 'start':
+        if action == 'run':
+            # Serviço dedicado: divide as câmeras com os outros nós por concessões no banco
+            DetectionDaemon(name=options['node_name']).run()
+            
+        elif action == 'start':
             result = start_motion_detection()
             self.stdout.write(
                 self.style.SUCCESS(f'✅ {result}')
             )
+            if detection_supervisor.running:
+                # Os shards são filhos deste processo e morreriam com o comando
+                self.stdout.write('   • Detecção em primeiro plano; Ctrl+C para parar')
+                stop_requested = threading.Event()
+                for signum in (signal.SIGINT, signal.SIGTERM):
+                    signal.signal(signum, lambda *args: stop_requested.set())
+                while not stop_requested.wait(1):
+                    pass
+                result = stop_motion_detection()
+                self.stdout.write(
+                    self.style.WARNING(f'🛑 {result}')
+                )
             
         elif action == 'stop':
             result = stop_motion_detection()
@@ -35,9 +62,38 @@ class Command(BaseCommand):
             self.stdout.write(f'   • Câmeras ativas: {status["total_active"]}')
             self.stdout.write(f'   • Gravando: {status["recording_cameras"]}')
             
-            if status['active_cameras']:
+            self.stdout.write(f'   • Em repouso (taxa reduzida): {status["idle_cameras"]}')
+            self.stdout.write(f'   • Sem stream (reconectando): {status["reconnecting_cameras"]}')
+            
+            if status['cameras']:
                 self.stdout.write(f'   • Câmeras monitorando:')
-                for camera in status['active_cameras']:
-                    self.stdout.write(f'     - {camera}')
+                self.write_cameras(status['cameras'])
+            else:
+                self.stdout.write('   • Nenhuma câmera ativa')
+            
+            for shard in status['shards']:
+                self.stdout.write(
+                    f'   • Processo {shard["shard"]} (pid {shard["pid"]}): '
+                    f'{shard["cameras"]} câmeras, {shard["cpu_percent"]}% CPU, {shard["fps"]} fps'
+                ) 
+            
+            for node in status['nodes']:
+                self.stdout.write(
+                    f'   • Nó {node["name"]} ({node["hostname"]}, pid {node["pid"]}): '
+                    f'{node["cameras"]} câmeras, {node["recording_cameras"]} gravando, '
+                    f'{node["reconnecting_cameras"]} reconectando, sinal há {node["heartbeat_age"]}s'
+                )
+                self.write_cameras(node['camera_status'])
+
+    def write_cameras(self, cameras):
+        """Taxa de análise, conexão e gravação de cada câmera"""
+        for camera in cameras:
+            rate = f'{camera["analysis_fps"]} fps' if camera['analysis_fps'] else 'todos os frames'
+            mode = 'repouso' if camera['sampling'] == 'idle' else 'ativa'
+            recording = ', gravando' if camera['recording'] else ''
+            self.stdout.write(f'     - {camera["name"]}: {rate} ({mode}{recording})')
+            if camera['state'] == 'streaming':
+                connection = f'conectada há {camera["uptime"]:.0f}s, último frame há {camera["last_frame_age"]}s'
             else:
-                self.stdout.write('   • Nenhuma câmera ativa') 
\ No newline at end of file
+                connection = 'reconectando'
+            self.stdout.write(f'       {connection}, {camera["reconnects"]} reconexões')
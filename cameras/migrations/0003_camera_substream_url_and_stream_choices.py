@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cameras', '0002_alter_camera_stream_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='camera',
+            name='substream_url',
+            field=models.CharField(blank=True, max_length=500, verbose_name='URL do Substream'),
+        ),
+        migrations.AddField(
+            model_name='camerasettings',
+            name='detection_stream',
+            field=models.CharField(choices=[('main', 'Stream Principal'), ('sub', 'Substream')], default='sub', max_length=10, verbose_name='Stream da Detecção de Movimento'),
+        ),
+        migrations.AddField(
+            model_name='camerasettings',
+            name='live_view_stream',
+            field=models.CharField(choices=[('main', 'Stream Principal'), ('sub', 'Substream')], default='main', max_length=10, verbose_name='Stream da Visualização ao Vivo'),
+        ),
+        migrations.AddField(
+            model_name='camerasettings',
+            name='snapshot_stream',
+            field=models.CharField(choices=[('main', 'Stream Principal'), ('sub', 'Substream')], default='sub', max_length=10, verbose_name='Stream de Snapshots e Mosaicos'),
+        ),
+    ]
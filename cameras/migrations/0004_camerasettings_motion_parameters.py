@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cameras', '0003_camera_substream_url_and_stream_choices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='camerasettings',
+            name='motion_blur_size',
+            field=models.IntegerField(default=21, verbose_name='Tamanho do Desfoque (pixels)'),
+        ),
+        migrations.AddField(
+            model_name='camerasettings',
+            name='motion_min_area',
+            field=models.IntegerField(default=3000, verbose_name='Área Mínima de Movimento (pixels)'),
+        ),
+        migrations.AddField(
+            model_name='camerasettings',
+            name='motion_min_frames',
+            field=models.IntegerField(default=2, verbose_name='Frames para Confirmar Movimento'),
+        ),
+        migrations.AddField(
+            model_name='camerasettings',
+            name='motion_pixel_threshold',
+            field=models.IntegerField(default=25, verbose_name='Limiar de Diferença de Pixel'),
+        ),
+    ]
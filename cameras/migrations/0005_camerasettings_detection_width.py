@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cameras', '0004_camerasettings_motion_parameters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='camerasettings',
+            name='detection_width',
+            field=models.IntegerField(default=320, verbose_name='Largura de Processamento da Detecção (pixels)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cameras', '0005_camerasettings_detection_width'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='camerasettings',
+            name='detection_method',
+            field=models.CharField(choices=[('frame_diff', 'Diferença entre Frames'), ('motion_vectors', 'Vetores de Movimento (H.264)')], default='frame_diff', max_length=20, verbose_name='Método de Detecção'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cameras', '0006_camerasettings_detection_method'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CameraMask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Nome')),
+                ('mask_type', models.CharField(choices=[('include', 'Região de Interesse'), ('exclude', 'Região Excluída')], default='exclude', max_length=10, verbose_name='Tipo')),
+                ('points', models.JSONField(default=list, verbose_name='Pontos')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativa')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')),
+                ('camera', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='masks', to='cameras.camera')),
+            ],
+            options={
+                'verbose_name': 'Máscara de Detecção',
+                'verbose_name_plural': 'Máscaras de Detecção',
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
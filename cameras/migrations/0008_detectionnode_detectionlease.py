@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 23:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cameras', '0007_cameramask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Nome')),
+                ('hostname', models.CharField(max_length=255, verbose_name='Host')),
+                ('pid', models.IntegerField(verbose_name='PID')),
+                ('started_at', models.DateTimeField(verbose_name='Iniciado em')),
+                ('last_heartbeat', models.DateTimeField(db_index=True, verbose_name='Último Sinal')),
+                ('status', models.JSONField(blank=True, default=dict, verbose_name='Status da Detecção')),
+            ],
+            options={
+                'verbose_name': 'Nó de Detecção',
+                'verbose_name_plural': 'Nós de Detecção',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DetectionLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('acquired_at', models.DateTimeField(verbose_name='Concedida em')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Expira em')),
+                ('camera', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='detection_lease', to='cameras.camera')),
+                ('node', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leases', to='cameras.detectionnode')),
+            ],
+            options={
+                'verbose_name': 'Concessão de Detecção',
+                'verbose_name_plural': 'Concessões de Detecção',
+            },
+        ),
+    ]
@@ -27,6 +27,7 @@ class Camera(models.Model):
     ip_address = models.GenericIPAddressField(verbose_name='Endereço IP')
     port = models.IntegerField(default=554, verbose_name='Porta')
     stream_url = models.CharField(max_length=500, verbose_name='URL do Stream')
+    substream_url = models.CharField(max_length=500, blank=True, verbose_name='URL do Substream')
     camera_type = models.CharField(max_length=10, choices=CAMERA_TYPES, default='rtsp', verbose_name='Tipo')
     username = models.CharField(max_length=50, blank=True, verbose_name='Usuário')
     password = models.CharField(max_length=100, blank=True, verbose_name='Senha')
@@ -46,31 +47,69 @@ class Camera(models.Model):
     def __str__(self):
         return self.name
     
-    def get_stream_url(self):
-        """Retorna a URL completa do stream com autenticação se necessário"""
+    def get_stream_url(self, stream='main'):
+        """Retorna a URL completa do stream com autenticação se necessário
+        
+        stream='sub' usa o substream (baixa resolução) quando configurado e
+        cai para o stream principal caso contrário.
+        """
+        url = self.stream_url
+        if stream == 'sub' and self.substream_url:
+            url = self.substream_url
+        
         # Se a URL já contém credenciais, retornar como está
-        if '@' in self.stream_url:
-            return self.stream_url
+        if '@' in url:
+            return url
         
         # Se não tem credenciais na URL mas tem username/password, adicionar
         if self.username and self.password:
-            if '://' in self.stream_url:
-                protocol, rest = self.stream_url.split('://', 1)
+            if '://' in url:
+                protocol, rest = url.split('://', 1)
                 return f"{protocol}://{self.username}:{self.password}@{rest}"
         
-        return self.stream_url
+        return url
+    
+    def get_stream_for(self, consumer):
+        """Retorna 'main' ou 'sub' para um consumidor ('live_view', 'detection' ou 'snapshot')"""
+        camera_settings = getattr(self, 'settings', None)
+        stream = getattr(camera_settings, f'{consumer}_stream', None)
+        if stream is None:
+            stream = CameraSettings.DEFAULT_STREAMS[consumer]
+        return stream if self.substream_url else 'main'
     
     def update_status(self, status):
-        """Atualiza o status da câmera"""
+        """Atualiza o status da câmera e notifica os navegadores se ele mudou"""
+        changed = self.status != status
         self.status = status
         if status == 'online':
             self.last_seen = timezone.now()
         self.save(update_fields=['status', 'last_seen'])
+        
+        if changed:
+            from .events import event_bus
+            event_bus.publish('camera_status', self.id, status=status, status_display=self.get_status_display())
 
 
 class CameraSettings(models.Model):
     """Configurações específicas de cada câmera"""
     
+    STREAM_CHOICES = [
+        ('main', 'Stream Principal'),
+        ('sub', 'Substream'),
+    ]
+    
+    DETECTION_METHOD_CHOICES = [
+        ('frame_diff', 'Diferença entre Frames'),
+        ('motion_vectors', 'Vetores de Movimento (H.264)'),
+    ]
+    
+    # Stream usado por cada consumidor quando a câmera tem substream
+    DEFAULT_STREAMS = {
+        'live_view': 'main',
+        'detection': 'sub',
+        'snapshot': 'sub',
+    }
+    
     camera = models.OneToOneField(Camera, on_delete=models.CASCADE, related_name='settings')
     motion_sensitivity = models.FloatField(default=0.3, verbose_name='Sensibilidade de Movimento')
     recording_quality = models.CharField(max_length=20, default='medium', verbose_name='Qualidade da Gravação')
@@ -80,6 +119,15 @@ class CameraSettings(models.Model):
     recording_duration = models.IntegerField(default=30, verbose_name='Duração da Gravação (segundos)')
     motion_timeout = models.IntegerField(default=4, verbose_name='Timeout de Movimento (segundos)')
     motion_start_delay = models.IntegerField(default=10, verbose_name='Delay de Início (segundos)')
+    live_view_stream = models.CharField(max_length=10, choices=STREAM_CHOICES, default='main', verbose_name='Stream da Visualização ao Vivo')
+    detection_stream = models.CharField(max_length=10, choices=STREAM_CHOICES, default='sub', verbose_name='Stream da Detecção de Movimento')
+    snapshot_stream = models.CharField(max_length=10, choices=STREAM_CHOICES, default='sub', verbose_name='Stream de Snapshots e Mosaicos')
+    motion_pixel_threshold = models.IntegerField(default=25, verbose_name='Limiar de Diferença de Pixel')
+    motion_min_area = models.IntegerField(default=3000, verbose_name='Área Mínima de Movimento (pixels)')
+    motion_min_frames = models.IntegerField(default=2, verbose_name='Frames para Confirmar Movimento')
+    motion_blur_size = models.IntegerField(default=21, verbose_name='Tamanho do Desfoque (pixels)')
+    detection_width = models.IntegerField(default=320, verbose_name='Largura de Processamento da Detecção (pixels)')
+    detection_method = models.CharField(max_length=20, choices=DETECTION_METHOD_CHOICES, default='frame_diff', verbose_name='Método de Detecção')
     
     class Meta:
         verbose_name = 'Configuração de Câmera'
@@ -89,6 +137,71 @@ class CameraSettings(models.Model):
         return f"Configurações de {self.camera.name}"
 
 
+class CameraMask(models.Model):
+    """Polígono de região de interesse ou de exclusão da detecção de movimento"""
+    
+    MASK_TYPE_CHOICES = [
+        ('include', 'Região de Interesse'),
+        ('exclude', 'Região Excluída'),
+    ]
+    
+    camera = models.ForeignKey(Camera, on_delete=models.CASCADE, related_name='masks')
+    name = models.CharField(max_length=100, verbose_name='Nome')
+    mask_type = models.CharField(max_length=10, choices=MASK_TYPE_CHOICES, default='exclude', verbose_name='Tipo')
+    # Vértices [[x, y], ...] normalizados entre 0 e 1, independentes da resolução
+    points = models.JSONField(default=list, verbose_name='Pontos')
+    is_active = models.BooleanField(default=True, verbose_name='Ativa')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')
+    
+    class Meta:
+        verbose_name = 'Máscara de Detecção'
+        verbose_name_plural = 'Máscaras de Detecção'
+        ordering = ['created_at']
+    
+    def __str__(self):
+        return f"{self.camera.name} - {self.name} ({self.get_mask_type_display()})"
+
+
+class DetectionNode(models.Model):
+    """Serviço de detecção de movimento (manage.py motion_detection run) em algum host"""
+    
+    name = models.CharField(max_length=100, unique=True, verbose_name='Nome')
+    hostname = models.CharField(max_length=255, verbose_name='Host')
+    pid = models.IntegerField(verbose_name='PID')
+    started_at = models.DateTimeField(verbose_name='Iniciado em')
+    last_heartbeat = models.DateTimeField(db_index=True, verbose_name='Último Sinal')
+    # Último get_status() do supervisor do nó, para o status de qualquer processo
+    status = models.JSONField(default=dict, blank=True, verbose_name='Status da Detecção')
+    
+    class Meta:
+        verbose_name = 'Nó de Detecção'
+        verbose_name_plural = 'Nós de Detecção'
+        ordering = ['name']
+    
+    def __str__(self):
+        return f"{self.name} ({self.hostname})"
+
+
+class DetectionLease(models.Model):
+    """Concessão de uma câmera a um nó de detecção
+
+    O nó renova a concessão enquanto está vivo; depois de expires_at qualquer
+    outro nó pode assumir a câmera.
+    """
+    
+    camera = models.OneToOneField(Camera, on_delete=models.CASCADE, related_name='detection_lease')
+    node = models.ForeignKey(DetectionNode, on_delete=models.CASCADE, related_name='leases')
+    acquired_at = models.DateTimeField(verbose_name='Concedida em')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='Expira em')
+    
+    class Meta:
+        verbose_name = 'Concessão de Detecção'
+        verbose_name_plural = 'Concessões de Detecção'
+    
+    def __str__(self):
+        return f"{self.camera.name} → {self.node.name}"
+
+
 class CameraDiscovery(models.Model):
     """Modelo para armazenar câmeras descobertas via ONVIF"""
     
@@ -1,13 +1,20 @@
-import cv2
+import itertools
 import threading
 import time
 import os
 from datetime import datetime
+from django.conf import settings
 from django.utils import timezone
 from django.db import transaction
 from cameras.models import Camera
 from recordings.models import Recording, MotionEvent
-from recordings.tasks import start_motion_recording
+from recordings.incidents import MotionIncident
+from recordings.prebuffer import prebuffer_manager
+from cameras.events import event_bus
+from cameras.detection import AdaptiveSampler, MotionMetrics, MotionTrigger, create_pipeline
+from cameras.frame_sources import create_frame_source
+from cameras.supervisor import ReconnectBackoff, detection_supervisor
+from cameras.daemon import alive_nodes, get_nodes_status
 
 
 class MotionDetector:
@@ -15,31 +22,45 @@ class MotionDetector:
     
     def __init__(self):
         self.detection_threads = {}
-        self.recording_threads = {}
+        # Incidente de movimento atual (uma gravação) de cada câmera
+        self.incidents = {}
         self.running = False
+        # Cada worker iniciado recebe uma geração; só o da geração atual segue rodando
+        self.generations = itertools.count()
+        self.watchdog = None
         
     def start_detection_for_camera(self, camera_id):
         """Inicia detecção de movimento para uma câmera específica"""
-        if camera_id in self.detection_threads and self.detection_threads[camera_id]['running']:
+        current = self.detection_threads.get(camera_id)
+        if current is not None and current['running']:
             return f"Detecção já ativa para câmera {camera_id}"
         
         try:
             camera = Camera.objects.get(id=camera_id, is_active=True)
             
-            # Criar thread de detecção
-            thread = threading.Thread(
-                target=self._detection_worker,
-                args=(camera_id,),
-                daemon=True
-            )
-            
             self.detection_threads[camera_id] = {
-                'thread': thread,
+                'thread': None,
+                'generation': None,
                 'running': True,
-                'camera': camera
+                'camera': camera,
+                'frames': 0,
+                'motion_events': 0,
+                'cpu_time': 0.0,
+                'last_frame_time': 0,
+                'analysis_fps': 0,
+                'sampling': 'active',
+                # Conexão: estado, início da conexão atual e reconexões
+                'state': 'connecting',
+                'connected_at': 0,
+                'reconnects': 0,
+                'backoff': ReconnectBackoff.from_settings(),
+                'source': None,
+                'stalled_at': 0,
+                'retry_at': 0,
             }
             
-            thread.start()
+            self._spawn_worker(camera_id)
+            self._start_watchdog()
             print(f"✅ Detecção de movimento iniciada para {camera.name}")
             return f"Detecção iniciada para {camera.name}"
             
@@ -79,157 +100,310 @@ class MotionDetector:
         print(f"🛑 Detecção parada para {stopped_count} câmeras")
         return f"Detecção parada para {stopped_count} câmeras"
     
-    def _detection_worker(self, camera_id):
-        """Worker para detecção de movimento"""
+    def shutdown(self, timeout=30):
+        """Para todas as câmeras e espera os workers terminarem a limpeza
+
+        As threads são daemon: sem esperar, o processo sairia antes dos
+        finally que param os buffers pré-evento (ffmpeg órfão mantendo a
+        sessão RTSP e escrevendo no tmpfs) e das gravações em curso (sem
+        Recording e com o .ts parcial no disco). Incidentes e buffers de
+        workers que não terminaram no prazo são fechados aqui.
+        """
+        self.stop_detection_for_all_cameras()
+        deadline = time.time() + timeout
+        # Fechar todos de uma vez: as gravações terminam em paralelo
+        for incident in list(self.incidents.values()):
+            incident.close()
+        for stats in list(self.detection_threads.values()):
+            thread = stats['thread']
+            if thread is not None and thread.is_alive():
+                thread.join(max(0, deadline - time.time()))
+        # Worker preso numa leitura não chegou ao finally
+        for incident in list(self.incidents.values()):
+            if incident.is_alive():
+                incident.thread.join(max(0, deadline - time.time()))
+        self.incidents.clear()
+        prebuffer_manager.stop_all()
+    
+    def _detection_worker(self, camera_id, generation):
+        """Worker para detecção de movimento
+
+        Não desiste da câmera: conexões que falham ou caem são refeitas após a
+        espera do ReconnectBackoff enquanto a detecção estiver ativa. Leituras
+        travadas ficam a cargo do watchdog.
+        """
+        stats = self.detection_threads.get(camera_id)
+        if stats is None or stats['generation'] != generation:
+            # Câmera removida (ou worker substituído) antes de a thread começar
+            return
+        camera = stats['camera']
+        backoff = stats['backoff']
         try:
-            camera = self.detection_threads[camera_id]['camera']
+            # Parâmetros de detecção vêm do CameraSettings da câmera
+            pipeline = create_pipeline(camera)
+            trigger = MotionTrigger(pipeline.params.min_motion_frames)
+            # Frames desde o primeiro movimento antes da confirmação de um incidente;
+            # movimento esporádico (ruído, folhas) chega à confirmação com confiança baixa
+            candidate = MotionMetrics()
+            confirm_window = settings.DVR_SETTINGS.get('MOTION_CONFIRM_WINDOW', 10)
+            min_peak_ratio = settings.DVR_SETTINGS.get('MOTION_MIN_PEAK_RATIO', 0.0)
+            min_confidence = settings.DVR_SETTINGS.get('MOTION_MIN_CONFIDENCE', 0.0)
+            # Cena parada é analisada a DETECTION_IDLE_FPS; movimento suspeito volta à taxa cheia
+            sampler = AdaptiveSampler.from_settings()
+            
+            # Detecção usa o substream (quando configurado); gravação segue no principal
+            detection_stream = camera.get_stream_for('detection')
+            source = create_frame_source(camera, pipeline)
             
-            # Configurações de detecção
-            motion_threshold = 3000  # Sensibilidade (menor = mais sensível)
-            min_motion_frames = 2    # Frames mínimos para confirmar movimento
-            motion_frames = 0
-            last_frame = None
-            retry_count = 0
-            max_retries = 3
-            last_recording_time = 0
-            min_recording_interval = 10  # Reduzido para 10 segundos entre gravações
+            print(f"🎥 Iniciando detecção para {camera.name} - stream {detection_stream} ({type(source).__name__})")
             
-            print(f"🎥 Iniciando detecção para {camera.name} - {camera.stream_url}")
+            # Últimos segundos do stream principal, para a gravação começar antes do disparo
+            prebuffer_manager.start(camera)
+            stats['analysis_fps'] = sampler.current_fps
             
-            while self.detection_threads.get(camera_id, {}).get('running', False):
+            while self._is_current(camera_id, generation):
+                stats['state'] = 'connecting'
+                connected_at = 0
                 try:
                     # Conectar ao stream
-                    cap = cv2.VideoCapture(camera.stream_url)
-                    if not cap.isOpened():
+                    if not source.open():
                         print(f"❌ Não foi possível conectar ao stream da câmera {camera.name}")
-                        retry_count += 1
-                        if retry_count >= max_retries:
-                            print(f"🛑 Máximo de tentativas atingido para {camera.name}")
-                            break
-                        time.sleep(5)  # Esperar 5 segundos antes de tentar novamente
-                        continue
-                    
-                    # Configurar timeouts
-                    cap.set(cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, 5000)
-                    cap.set(cv2.CAP_PROP_READ_TIMEOUT_MSEC, 3000)
-                    
-                    print(f"✅ Conectado ao stream da câmera {camera.name}")
-                    retry_count = 0  # Resetar contador de tentativas
-                    
-                    # Loop de detecção
-                    while self.detection_threads.get(camera_id, {}).get('running', False):
-                        ret, frame = cap.read()
-                        if not ret:
-                            print(f"⚠️ Erro ao ler frame da câmera {camera.name}")
-                            break
-                        
-                        # Converter para escala de cinza
-                        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                        gray = cv2.GaussianBlur(gray, (21, 21), 0)
-                        
-                        if last_frame is None:
-                            last_frame = gray
-                            continue
-                        
-                        # Calcular diferença entre frames
-                        frame_delta = cv2.absdiff(last_frame, gray)
-                        thresh = cv2.threshold(frame_delta, 25, 255, cv2.THRESH_BINARY)[1]
+                    else:
+                        connected_at = time.time()
+                        print(f"✅ Conectado ao stream da câmera {camera.name}")
+                        pipeline.reset()
+                        # Reinicia o buffer se o ffmpeg caiu junto com o stream
+                        prebuffer_manager.start(camera)
+                        stats['source'] = source
+                        stats['connected_at'] = connected_at
+                        stats['last_frame_time'] = connected_at
+                        stats['state'] = 'streaming'
                         
-                        # Dilatar para preencher buracos
-                        thresh = cv2.dilate(thresh, None, iterations=2)
-                        
-                        # Encontrar contornos
-                        contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                        
-                        # Verificar movimento
-                        motion_detected = False
-                        for contour in contours:
-                            if cv2.contourArea(contour) > motion_threshold:
-                                motion_detected = True
+                        # Loop de detecção
+                        while self._is_current(camera_id, generation):
+                            now = time.time()
+                            if not sampler.should_analyse(now):
+                                # Fora da taxa de análise: apenas manter o stream em dia
+                                if not source.skip():
+                                    print(f"⚠️ Erro ao ler frame da câmera {camera.name}")
+                                    break
+                                stats['last_frame_time'] = now
+                                continue
+                            
+                            ret, frame = source.read()
+                            if not ret:
+                                print(f"⚠️ Erro ao ler frame da câmera {camera.name}")
                                 break
-                        
-                        if motion_detected:
-                            motion_frames += 1
-                            if motion_frames >= min_motion_frames:
-                                # Verificar se passou tempo suficiente desde a última gravação
-                                current_time = time.time()
-                                if current_time - last_recording_time >= min_recording_interval:
-                                    # Movimento confirmado - iniciar gravação via Celery
-                                    print(f"🚨 MOVIMENTO DETECTADO em {camera.name}!")
-                                    self._start_recording(camera_id)
-                                    last_recording_time = current_time
-                                    motion_frames = 0
-                                    time.sleep(2)  # Pausa para evitar múltiplas gravações
+                            
+                            cpu_start = time.thread_time()
+                            result = pipeline.process(frame, source.source_size)
+                            trigger_state = trigger.update(result.motion)
+                            stats['cpu_time'] += time.thread_time() - cpu_start
+                            stats['frames'] += 1
+                            stats['last_frame_time'] = now
+                            
+                            if sampler.update(result, pipeline.params.min_area, now):
+                                if sampler.idle:
+                                    print(f"💤 {camera.name} sem atividade - análise a {sampler.current_fps} fps")
                                 else:
-                                    remaining_time = min_recording_interval - (current_time - last_recording_time)
-                                    print(f"⏰ Movimento detectado em {camera.name} - Aguardando {remaining_time:.1f}s para próxima gravação")
-                                    motion_frames = 0
-                        else:
-                            motion_frames = 0
-                        
-                        last_frame = gray
-                        time.sleep(0.1)  # Pequena pausa
-                    
-                    cap.release()
+                                    print(f"⚡ Atividade em {camera.name} - análise em taxa cheia")
+                            stats['analysis_fps'] = sampler.current_fps
+                            stats['sampling'] = sampler.mode
+                            
+                            incident = self.incidents.get(camera_id)
+                            if incident is not None and incident.is_open():
+                                # Movimento dentro do incidente adia o fim da gravação
+                                incident.update(result)
+                            else:
+                                if result.motion or candidate.frames:
+                                    candidate.add(result)
+                                if candidate.quiet_frames >= confirm_window:
+                                    candidate = MotionMetrics()
+                                
+                                if trigger_state == 'confirmed':
+                                    metrics, candidate = candidate, MotionMetrics()
+                                    if metrics.is_weak(min_peak_ratio=min_peak_ratio, min_confidence=min_confidence):
+                                        # Descartado antes de abrir gravação: nenhum ffmpeg nem escrita em disco
+                                        print(
+                                            f"🔅 Movimento fraco ignorado em {camera.name}: pico {metrics.peak_ratio:.2%} do frame, "
+                                            f"confiança {metrics.confidence:.2f} ({metrics.motion_frames}/{metrics.active_frames} frames)"
+                                        )
+                                    else:
+                                        # Movimento confirmado - novo incidente com uma única gravação
+                                        print(f"🚨 MOVIMENTO DETECTADO em {camera.name}!")
+                                        stats['motion_events'] += 1
+                                        event_bus.publish(
+                                            'motion', camera.id, camera_name=camera.name,
+                                            area=result.source_area(), bbox=result.bbox,
+                                            ratio=round(metrics.peak_ratio, 5),
+                                        )
+                                        self._start_incident(camera_id, camera, metrics)
                     
                 except Exception as e:
                     print(f"❌ Erro na detecção para câmera {camera.name}: {e}")
-                    retry_count += 1
-                    if retry_count >= max_retries:
-                        print(f"🛑 Máximo de tentativas atingido para {camera.name}")
-                        break
-                    time.sleep(5)  # Esperar antes de tentar novamente
+                finally:
+                    source.release()
+                    if self._owns(camera_id, generation):
+                        stats['source'] = None
+                        stats['connected_at'] = 0
+                
+                if not self._is_current(camera_id, generation):
+                    break
+                # Falha ou queda: nova tentativa após espera exponencial com jitter
+                delay = backoff.next_delay(time.time() - connected_at if connected_at else 0)
+                stats['reconnects'] += 1
+                stats['state'] = 'backoff'
+                print(f"🔄 Reconectando {camera.name} em {delay:.1f}s (tentativa {backoff.failures})")
+                self._wait(camera_id, generation, delay)
                     
             print(f"🛑 Detecção finalizada para {camera.name}")
             
         except Exception as e:
             print(f"❌ Erro fatal na detecção para câmera {camera_id}: {e}")
         finally:
-            if camera_id in self.detection_threads:
-                self.detection_threads[camera_id]['running'] = False
+            # Um worker substituído pelo watchdog deixa incidente e buffer para o novo
+            if self._owns(camera_id, generation):
+                incident = self.incidents.pop(camera_id, None)
+                if incident is not None:
+                    # Fecha a gravação antes de parar o buffer que a alimenta
+                    incident.close()
+                    if incident.is_alive():
+                        incident.thread.join(timeout=15)
+                prebuffer_manager.stop(camera_id)
+                # Ainda ativa após erro fatal: o watchdog reinicia o worker
+                stats['state'] = 'failed' if stats['running'] else 'stopped'
     
-    def _start_recording(self, camera_id):
-        """Inicia gravação para uma câmera diretamente"""
-        try:
-            camera = self.detection_threads[camera_id]['camera']
-            
-            # Verificar se já está gravando
-            if camera_id in self.recording_threads and self.recording_threads[camera_id]['running']:
-                print(f"📹 Já gravando {camera.name}")
-                return
-            
-            # Marcar como gravando
-            self.recording_threads[camera_id] = {
-                'running': True,
-                'start_time': time.time()
-            }
-            
-            # Iniciar gravação diretamente
-            print(f"📹 Iniciando gravação por movimento diretamente para {camera.name}")
+    def _is_current(self, camera_id, generation):
+        """Se o worker desta geração ainda deve rodar"""
+        data = self.detection_threads.get(camera_id)
+        return data is not None and data['running'] and data['generation'] == generation
+    
+    def _owns(self, camera_id, generation):
+        """Se nenhum worker mais novo assumiu a câmera"""
+        data = self.detection_threads.get(camera_id)
+        return data is None or data['generation'] == generation
+    
+    def _wait(self, camera_id, generation, seconds):
+        """Espera seconds segundos, saindo antes se a detecção for parada"""
+        deadline = time.time() + seconds
+        while self._is_current(camera_id, generation) and time.time() < deadline:
+            time.sleep(min(0.5, max(0, deadline - time.time())))
+    
+    def _spawn_worker(self, camera_id):
+        """Inicia um worker novo para a câmera; um worker anterior deixa de ser o atual"""
+        stats = self.detection_threads.get(camera_id)
+        if stats is None:
+            return
+        generation = next(self.generations)
+        thread = threading.Thread(
+            target=self._detection_worker,
+            args=(camera_id, generation),
+            daemon=True
+        )
+        stats.update({
+            'thread': thread,
+            'generation': generation,
+            'state': 'connecting',
+            'stalled_at': 0,
+            'retry_at': 0,
+        })
+        thread.start()
+    
+    def _start_watchdog(self):
+        if self.watchdog is None or not self.watchdog.is_alive():
+            self.watchdog = threading.Thread(target=self._watchdog, daemon=True)
+            self.watchdog.start()
+    
+    def _watchdog(self):
+        """Vigia os workers de detecção deste processo
+
+        Câmera conectada sem frame há DETECTION_STALL_TIMEOUT segundos tem a
+        leitura interrompida (o worker reconecta com backoff); se o worker
+        continuar preso por mais um timeout ele é abandonado e substituído.
+        Workers que morreram por erro são reiniciados após a espera do backoff,
+        assim como buffers pré-evento cujo ffmpeg morreu.
+        """
+        stall_timeout = settings.DVR_SETTINGS.get('DETECTION_STALL_TIMEOUT', 15)
+        while True:
+            time.sleep(1)
+            now = time.time()
+            for camera_id, stats in list(self.detection_threads.items()):
+                if not stats['running']:
+                    continue
+                try:
+                    self._check_worker(camera_id, stats, now, stall_timeout)
+                except Exception as e:
+                    print(f"❌ Erro no watchdog da câmera {camera_id}: {e}")
             try:
-                # Executar gravação diretamente
-                result = start_motion_recording(camera_id)
-                print(f"✅ Gravação iniciada diretamente: {result}")
-            except Exception as direct_error:
-                print(f"❌ Erro na gravação direta: {direct_error}")
-                if camera_id in self.recording_threads:
-                    self.recording_threads[camera_id]['running'] = False
-                return
-            
-            # Limpar flag de gravação após um tempo
-            def clear_recording_flag():
-                time.sleep(15)  # Reduzido para 15 segundos (um pouco mais que a duração da gravação)
-                if camera_id in self.recording_threads:
-                    self.recording_threads[camera_id]['running'] = False
-            
-            # Executar limpeza em thread separada
-            cleanup_thread = threading.Thread(target=clear_recording_flag, daemon=True)
-            cleanup_thread.start()
-            
-        except Exception as e:
-            print(f"❌ Erro ao iniciar gravação para câmera {camera_id}: {e}")
-            if camera_id in self.recording_threads:
-                self.recording_threads[camera_id]['running'] = False
+                prebuffer_manager.revive()
+            except Exception as e:
+                print(f"❌ Erro ao reiniciar buffers pré-evento: {e}")
+    
+    def _check_worker(self, camera_id, stats, now, stall_timeout):
+        camera = stats['camera']
+        if stats['thread'] is None:
+            return
+        if not stats['thread'].is_alive():
+            if not stats['retry_at']:
+                delay = stats['backoff'].next_delay()
+                stats['retry_at'] = now + delay
+                stats['state'] = 'backoff'
+                print(f"🔄 Reiniciando detecção de {camera.name} em {delay:.1f}s")
+            elif now >= stats['retry_at']:
+                stats['reconnects'] += 1
+                self._spawn_worker(camera_id)
+            return
+        
+        if stats['state'] != 'streaming':
+            return
+        age = now - stats['last_frame_time']
+        if age < stall_timeout:
+            stats['stalled_at'] = 0
+        elif not stats['stalled_at']:
+            print(f"⏱️ {camera.name} sem frames há {age:.0f}s - interrompendo a leitura")
+            stats['stalled_at'] = now
+            source = stats['source']
+            if source is not None:
+                source.interrupt()
+        elif now - stats['stalled_at'] >= stall_timeout:
+            # Leitura não retornou nem após a interrupção: abandonar a thread presa
+            print(f"♻️ Worker de {camera.name} travado há {age:.0f}s - substituindo")
+            stats['reconnects'] += 1
+            self._spawn_worker(camera_id)
+    
+    def get_camera_stats(self):
+        """Retorna contadores de cada câmera em detecção neste processo"""
+        now = time.time()
+        return {
+            camera_id: {
+                'name': data['camera'].name,
+                'running': data['running'],
+                'frames': data['frames'],
+                'motion_events': data['motion_events'],
+                'cpu_time': data['cpu_time'],
+                'last_frame_time': data['last_frame_time'],
+                'analysis_fps': data['analysis_fps'],
+                'sampling': data['sampling'],
+                'recording': camera_id in self.incidents and self.incidents[camera_id].is_alive(),
+                'state': data['state'],
+                'uptime': round(now - data['connected_at'], 1) if data['connected_at'] else 0,
+                'reconnects': data['reconnects'],
+                'last_frame_age': round(now - data['last_frame_time'], 1) if data['last_frame_time'] else None,
+            }
+            for camera_id, data in list(self.detection_threads.items())
+        }
+    
+    def _start_incident(self, camera_id, camera, metrics):
+        """Abre um incidente: uma gravação que segue aberta enquanto houver movimento"""
+        incident = MotionIncident.for_camera(camera, metrics)
+        self.incidents[camera_id] = incident
+        
+        if not camera.recording_enabled:
+            print(f"⚠️ Gravação desabilitada para {camera.name}; incidente apenas registrado")
+            return incident
+        
+        print(f"📹 Gravando {camera.name} até {incident.motion_timeout}s sem movimento")
+        return incident.start()
 
 
 # Instância global do detector
@@ -237,24 +411,23 @@ motion_detector = MotionDetector()
 
 
 def start_motion_detection():
-    """Função para iniciar detecção de movimento"""
-    return motion_detector.start_detection_for_all_cameras()
+    """Função para iniciar detecção de movimento (câmeras distribuídas entre processos)"""
+    # Com nós de detecção rodando (motion_detection run) as câmeras já são deles
+    nodes = alive_nodes().count()
+    if nodes:
+        print(f"🛰️ Detecção gerenciada por {nodes} nós de detecção; nada iniciado neste processo")
+        return f"Detecção gerenciada por {nodes} nós de detecção"
+    return detection_supervisor.start()
 
 
 def stop_motion_detection():
     """Função para parar detecção de movimento"""
-    return motion_detector.stop_detection_for_all_cameras()
+    return detection_supervisor.stop()
 
 
 def get_detection_status():
-    """Retorna status da detecção de movimento"""
-    active_cameras = []
-    for camera_id, data in motion_detector.detection_threads.items():
-        if data['running']:
-            active_cameras.append(data['camera'].name)
-    
-    return {
-        'active_cameras': active_cameras,
-        'total_active': len(active_cameras),
-        'recording_cameras': len([c for c in motion_detector.recording_threads.values() if c['running']])
-    } 
\ No newline at end of file
+    """Retorna status da detecção de movimento e a carga de cada processo"""
+    status = detection_supervisor.get_status()
+    # Nós de detecção de todos os hosts, pelo status que publicam no banco
+    status['nodes'] = get_nodes_status()
+    return status 
\ No newline at end of file
@@ -0,0 +1,50 @@
+import cv2
+import numpy as np
+from functools import lru_cache
+
+
+# Textos exibidos para cada estado de falha do snapshot
+PLACEHOLDER_TEXTS = {
+    'offline': ('Camera Offline', 'RTSP Auth Required'),
+    'no_signal': ('No Signal', 'Camera Error'),
+    'error': ('Error', 'Stream Error'),
+}
+
+
+def _put_centered_text(image, text, center_y, scale, color, thickness):
+    """Escreve um texto centralizado horizontalmente"""
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    (text_width, text_height), _ = cv2.getTextSize(text, font, scale, thickness)
+    x = max(0, (image.shape[1] - text_width) // 2)
+    y = center_y + text_height // 2
+    cv2.putText(image, text, (x, y), font, scale, color, thickness)
+
+
+@lru_cache(maxsize=32)
+def render_placeholder(state, width=640, height=480):
+    """Retorna a imagem (BGR) do placeholder de um estado e tamanho
+
+    A imagem é gerada apenas na primeira chamada para cada combinação e
+    reaproveitada nas seguintes, por isso é marcada como somente leitura.
+    """
+    title, subtitle = PLACEHOLDER_TEXTS.get(state, PLACEHOLDER_TEXTS['error'])
+
+    placeholder = np.zeros((height, width, 3), dtype=np.uint8)
+    placeholder[:] = (128, 128, 128)  # Cinza
+
+    # Escala do texto proporcional à largura (referência: 640px)
+    scale = width / 640
+    _put_centered_text(placeholder, title, int(height * 0.5), 1.0 * scale, (255, 255, 255), max(1, int(2 * scale)))
+    _put_centered_text(placeholder, subtitle, int(height * 0.58), 0.7 * scale, (200, 200, 200), max(1, int(2 * scale)))
+
+    placeholder.flags.writeable = False
+    return placeholder
+
+
+@lru_cache(maxsize=32)
+def get_placeholder_jpeg(state, width=640, height=480):
+    """Retorna o JPEG pré-renderizado do placeholder de um estado e tamanho"""
+    ret, buffer = cv2.imencode('.jpg', render_placeholder(state, width, height))
+    if not ret:
+        return None
+    return buffer.tobytes()
@@ -0,0 +1,124 @@
+import cv2
+import math
+import numpy as np
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+
+from .placeholders import render_placeholder
+from .streaming import capture_manager
+
+
+class ThumbnailSprite:
+    """Um único JPEG com a miniatura de várias câmeras e o mapa de posições"""
+
+    def __init__(self, jpeg, tiles, cols, rows, tile_size):
+        self.jpeg = jpeg
+        self.tiles = tiles
+        self.cols = cols
+        self.rows = rows
+        self.tile_size = tile_size
+        self.created_at = time.time()
+        self.version = f'{int(self.created_at * 1000):x}'
+
+    @property
+    def size(self):
+        return self.cols * self.tile_size[0], self.rows * self.tile_size[1]
+
+    def to_dict(self):
+        width, height = self.size
+        return {
+            'version': self.version,
+            'width': width,
+            'height': height,
+            'cols': self.cols,
+            'rows': self.rows,
+            'tile_width': self.tile_size[0],
+            'tile_height': self.tile_size[1],
+            'tiles': self.tiles,
+        }
+
+
+class SpriteCache:
+    """Monta e mantém em cache os sprites de miniaturas por conjunto de câmeras
+
+    Os frames vêm do cache dos hubs de captura. Câmeras sem frame recente são
+    capturadas em paralelo (uma busca por câmera, compartilhada com os
+    snapshots) e o sprite resultante é servido a todos os navegadores por
+    SPRITE_CACHE_SECONDS segundos.
+    """
+
+    def __init__(self):
+        self.sprites = {}
+        self.builds = {}
+        self.lock = threading.Lock()
+
+    def get_sprite(self, cameras, tile_size):
+        """Retorna o sprite das câmeras, reconstruindo-o se expirou"""
+        cameras = list(cameras)
+        key = (tuple(str(camera.id) for camera in cameras), tuple(tile_size))
+        max_age = settings.DVR_SETTINGS.get('SPRITE_CACHE_SECONDS', 5)
+
+        with self.lock:
+            sprite = self.sprites.get(key)
+            if sprite is not None and time.time() - sprite.created_at <= max_age:
+                return sprite
+            build_lock = self.builds.setdefault(key, threading.Lock())
+
+        # Apenas uma montagem por conjunto; as demais requisições aguardam
+        with build_lock:
+            with self.lock:
+                sprite = self.sprites.get(key)
+                if sprite is not None and time.time() - sprite.created_at <= max_age:
+                    return sprite
+
+            sprite = self._build(cameras, tile_size)
+
+            with self.lock:
+                self.sprites[key] = sprite
+                # Descartar sprites de conjuntos que não são mais pedidos
+                for other_key, other in list(self.sprites.items()):
+                    if time.time() - other.created_at > max_age * 10:
+                        del self.sprites[other_key]
+                        self.builds.pop(other_key, None)
+            return sprite
+
+    def _fetch_frame(self, camera):
+        try:
+            _, _, frame, state = capture_manager.get_snapshot_frame(camera)
+            return frame, state
+        except Exception as e:
+            print(f"❌ Erro ao capturar miniatura da câmera {camera.name}: {e}")
+            return None, 'error'
+
+    def _build(self, cameras, tile_size):
+        tile_width, tile_height = tile_size
+        cols = max(1, math.ceil(math.sqrt(len(cameras))))
+        rows = max(1, math.ceil(len(cameras) / cols))
+        canvas = np.zeros((rows * tile_height, cols * tile_width, 3), dtype=np.uint8)
+
+        results = []
+        if cameras:
+            workers = min(len(cameras), settings.DVR_SETTINGS.get('SPRITE_FETCH_WORKERS', 8))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(self._fetch_frame, cameras))
+
+        tiles = {}
+        for index, (camera, (frame, state)) in enumerate(zip(cameras, results)):
+            col, row = index % cols, index // cols
+            x, y = col * tile_width, row * tile_height
+            if frame is not None:
+                tile = cv2.resize(frame, (tile_width, tile_height), interpolation=cv2.INTER_AREA)
+            else:
+                tile = render_placeholder(state, tile_width, tile_height)
+            canvas[y:y + tile_height, x:x + tile_width] = tile
+            tiles[str(camera.id)] = {'x': x, 'y': y, 'col': col, 'row': row, 'state': state}
+
+        ret, buffer = cv2.imencode('.jpg', canvas, [cv2.IMWRITE_JPEG_QUALITY, 75])
+        jpeg = buffer.tobytes() if ret else None
+        return ThumbnailSprite(jpeg, tiles, cols, rows, tile_size)
+
+
+# Instância global do cache de sprites
+sprite_cache = SpriteCache()
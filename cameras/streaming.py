@@ -0,0 +1,538 @@
+import asyncio
+import cv2
+import numpy as np
+import threading
+import time
+from contextlib import contextmanager
+from collections import OrderedDict
+from django.conf import settings
+
+
+# Tamanho padrão dos frames servidos ao vivo
+DEFAULT_STREAM_SIZE = (640, 480)
+
+# Quantidade de JPEGs mantidos no cache de cada fonte
+JPEG_CACHE_SIZE = 16
+
+
+def encode_jpeg(frame, size=None, quality=80):
+    """Redimensiona (se necessário) e codifica um frame em JPEG"""
+    if size and (frame.shape[1], frame.shape[0]) != tuple(size):
+        frame = cv2.resize(frame, tuple(size), interpolation=cv2.INTER_AREA)
+    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ret:
+        return None
+    return buffer.tobytes()
+
+
+class FrameBroadcaster:
+    """Publica o frame mais recente de uma fonte para vários consumidores"""
+
+    def __init__(self, key):
+        self.key = key
+        self.condition = threading.Condition()
+        self.frame = None
+        self.frame_seq = 0
+        self.frame_time = 0
+        self.subscribers = 0
+        self.running = False
+        self.thread = None
+        self.last_unsubscribe = time.time()
+        self._jpeg_cache = OrderedDict()
+        self._jpeg_pending = {}
+        self._async_waiters = set()
+
+    def _notify(self):
+        """Acorda consumidores síncronos e assíncronos (chamar com o lock adquirido)"""
+        self.condition.notify_all()
+        for loop, event in list(self._async_waiters):
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Event loop já encerrado
+                self._async_waiters.discard((loop, event))
+
+    def publish(self, frame):
+        """Publica um novo frame e acorda os consumidores"""
+        with self.condition:
+            self.frame = frame
+            self.frame_seq += 1
+            self.frame_time = time.time()
+            self._notify()
+
+    def latest(self):
+        """Retorna (seq, frame) do frame mais recente sem aguardar"""
+        with self.condition:
+            return self.frame_seq, self.frame
+
+    def wait_for_frame(self, last_seq, timeout=5.0):
+        """Aguarda um frame mais novo que last_seq; retorna (seq, frame)"""
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.frame_seq != last_seq or not self.running,
+                timeout=timeout
+            )
+            if self.frame_seq == last_seq:
+                return last_seq, None
+            return self.frame_seq, self.frame
+
+    async def async_wait_for_frame(self, last_seq, timeout=5.0):
+        """Versão assíncrona de wait_for_frame, sem ocupar uma thread por consumidor"""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = (loop, event)
+
+        with self.condition:
+            if self.frame_seq == last_seq and self.running:
+                self._async_waiters.add(waiter)
+            else:
+                event.set()
+
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self.condition:
+                self._async_waiters.discard(waiter)
+
+        with self.condition:
+            if self.frame_seq == last_seq:
+                return last_seq, None
+            return self.frame_seq, self.frame
+
+    async def async_wait_for_jpeg(self, last_seq, timeout=5.0, size=DEFAULT_STREAM_SIZE, quality=None):
+        """Versão assíncrona de wait_for_jpeg
+
+        Quando o JPEG já está no cache ele é retornado direto; a codificação
+        (acerto de cache falho) roda em uma thread para não bloquear o loop.
+        """
+        seq, frame = await self.async_wait_for_frame(last_seq, timeout)
+        if frame is None:
+            return seq, None
+        jpeg = self.peek_jpeg(seq, size, quality)
+        if jpeg is None:
+            jpeg = await asyncio.to_thread(self.get_jpeg, seq, frame, size, quality)
+        return seq, jpeg
+
+    def peek_jpeg(self, seq, size=DEFAULT_STREAM_SIZE, quality=None):
+        """Retorna o JPEG já codificado, sem codificar"""
+        if quality is None:
+            quality = settings.DVR_SETTINGS.get('LIVE_JPEG_QUALITY', 80)
+        with self.condition:
+            return self._jpeg_cache.get((seq, tuple(size), quality))
+
+    def get_jpeg(self, seq, frame, size=DEFAULT_STREAM_SIZE, quality=None):
+        """Retorna o JPEG do frame para (tamanho, qualidade)
+
+        Cada combinação é codificada uma única vez por frame e o mesmo objeto
+        bytes é entregue a todos os consumidores que pedirem a mesma saída.
+        """
+        if quality is None:
+            quality = settings.DVR_SETTINGS.get('LIVE_JPEG_QUALITY', 80)
+        key = (seq, tuple(size), quality)
+
+        with self.condition:
+            jpeg = self._jpeg_cache.get(key)
+            if jpeg is not None:
+                return jpeg
+            pending = self._jpeg_pending.get(key)
+            if pending is None:
+                pending = threading.Event()
+                self._jpeg_pending[key] = pending
+                owner = True
+            else:
+                owner = False
+
+        # Outro consumidor já está codificando este frame: aguardar o resultado
+        if not owner:
+            pending.wait(timeout=1.0)
+            with self.condition:
+                return self._jpeg_cache.get(key)
+
+        jpeg = None
+        try:
+            jpeg = encode_jpeg(frame, size, quality)
+        finally:
+            with self.condition:
+                if jpeg is not None:
+                    self._jpeg_cache[key] = jpeg
+                    while len(self._jpeg_cache) > JPEG_CACHE_SIZE:
+                        self._jpeg_cache.popitem(last=False)
+                self._jpeg_pending.pop(key, None)
+            pending.set()
+        return jpeg
+
+    def wait_for_jpeg(self, last_seq, timeout=5.0, size=DEFAULT_STREAM_SIZE, quality=None):
+        """Aguarda um frame novo e retorna (seq, jpeg)"""
+        seq, frame = self.wait_for_frame(last_seq, timeout)
+        if frame is None:
+            return seq, None
+        return seq, self.get_jpeg(seq, frame, size, quality)
+
+    def subscribe(self):
+        """Registra um consumidor, iniciando a fonte se necessário"""
+        with self.condition:
+            self.subscribers += 1
+            self.ensure_running()
+
+    def ensure_running(self):
+        """Inicia a fonte se ela não estiver rodando (ex.: desistiu de reconectar)"""
+        with self.condition:
+            if not self.running:
+                self.running = True
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def unsubscribe(self):
+        """Remove um consumidor"""
+        with self.condition:
+            self.subscribers = max(0, self.subscribers - 1)
+            self.last_unsubscribe = time.time()
+
+    @contextmanager
+    def subscription(self):
+        """Context manager que mantém a inscrição enquanto o consumidor estiver ativo"""
+        self.subscribe()
+        try:
+            yield self
+        finally:
+            self.unsubscribe()
+
+    def stop(self):
+        """Sinaliza parada da fonte"""
+        with self.condition:
+            self.running = False
+            self._notify()
+
+    def _finish(self):
+        """Marca a fonte como parada, salvo se outra thread já assumiu o loop"""
+        with self.condition:
+            if threading.current_thread() is self.thread:
+                self.running = False
+                self._notify()
+
+    def _should_stop(self, idle_timeout):
+        """Encerra a fonte (de forma atômica) se estiver ociosa"""
+        with self.condition:
+            if not self.running:
+                return True
+            if self.subscribers == 0 and time.time() - self.last_unsubscribe > idle_timeout:
+                self.running = False
+                self._notify()
+                return True
+            return False
+
+    def _run(self):
+        raise NotImplementedError
+
+
+class CaptureHub(FrameBroadcaster):
+    """Uma única conexão com a câmera compartilhada por todos os visualizadores"""
+
+    def __init__(self, camera_id, stream_url, stream='main'):
+        super().__init__(f'{camera_id}:{stream}')
+        self.camera_id = camera_id
+        self.stream = stream
+        self.stream_url = stream_url
+        self.idle_timeout = settings.DVR_SETTINGS.get('LIVE_STREAM_IDLE_TIMEOUT', 10)
+        self.max_reconnects = 3
+        self.snapshot_error = None
+        self.snapshot_error_time = 0
+
+    def get_recent_frame(self, max_age):
+        """Retorna (seq, frame) do último frame se ele tiver no máximo max_age segundos"""
+        with self.condition:
+            seq, frame, frame_time = self.frame_seq, self.frame, self.frame_time
+        if frame is None or time.time() - frame_time > max_age:
+            return None, None
+        return seq, frame
+
+    def get_recent_jpeg(self, max_age, size=DEFAULT_STREAM_SIZE):
+        """Retorna o JPEG do último frame se ele tiver no máximo max_age segundos"""
+        seq, frame = self.get_recent_frame(max_age)
+        if frame is None:
+            return None
+        return self.get_jpeg(seq, frame, size)
+
+    def get_recent_error(self, max_age):
+        """Retorna a última falha de captura avulsa se ela ainda for recente"""
+        if self.snapshot_error and time.time() - self.snapshot_error_time <= max_age:
+            return self.snapshot_error
+        return None
+
+    def capture_single_frame(self):
+        """Abre uma conexão avulsa, lê um frame e o publica no hub
+
+        Retorna 'ok', 'offline' (não conectou) ou 'no_signal' (sem frame).
+        """
+        cap = cv2.VideoCapture(self.stream_url)
+        try:
+            if not cap.isOpened():
+                state = 'offline'
+            else:
+                ret, frame = cap.read()
+                if ret:
+                    self.publish(frame)
+                    state = 'ok'
+                else:
+                    state = 'no_signal'
+        finally:
+            cap.release()
+
+        if state == 'ok':
+            self.snapshot_error = None
+        else:
+            self.snapshot_error = state
+            self.snapshot_error_time = time.time()
+        return state
+
+    def _run(self):
+        """Loop de captura: decodifica uma vez e publica para todos"""
+        reconnects = 0
+        print(f"🎥 Hub de captura iniciado para câmera {self.camera_id}")
+
+        try:
+            while not self._should_stop(self.idle_timeout):
+                cap = cv2.VideoCapture(self.stream_url)
+                if not cap.isOpened():
+                    cap.release()
+                    reconnects += 1
+                    if reconnects > self.max_reconnects:
+                        print(f"❌ Hub não conseguiu conectar à câmera {self.camera_id}")
+                        break
+                    time.sleep(2)
+                    continue
+
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+                try:
+                    while not self._should_stop(self.idle_timeout):
+                        ret, frame = cap.read()
+                        if not ret:
+                            print(f"⚠️ Erro ao ler frame no hub da câmera {self.camera_id}")
+                            break
+                        reconnects = 0
+                        self.publish(frame)
+                finally:
+                    cap.release()
+        except Exception as e:
+            print(f"❌ Erro no hub de captura da câmera {self.camera_id}: {e}")
+        finally:
+            self._finish()
+            print(f"🛑 Hub de captura finalizado para câmera {self.camera_id}")
+
+
+class MosaicHub(FrameBroadcaster):
+    """Compõe um mosaico N×M com os últimos frames de várias câmeras
+
+    O mosaico é montado e publicado uma vez por tick; todos os visualizadores
+    do mesmo layout recebem o mesmo JPEG.
+    """
+
+    BACKGROUND = (40, 40, 40)
+
+    # Intervalo entre tentativas de reiniciar o hub de uma câmera que caiu (segundos)
+    HUB_RETRY_INTERVAL = 10
+
+    def __init__(self, key, hubs, labels, cols, rows, tile_size, fps):
+        super().__init__(key)
+        self.hubs = hubs
+        self.labels = labels
+        self.cols = cols
+        self.rows = rows
+        self.tile_size = tile_size
+        self.fps = fps
+        self.idle_timeout = settings.DVR_SETTINGS.get('LIVE_STREAM_IDLE_TIMEOUT', 10)
+
+    @property
+    def size(self):
+        tile_width, tile_height = self.tile_size
+        return self.cols * tile_width, self.rows * tile_height
+
+    def _draw_tile(self, canvas, index, frame):
+        """Desenha um tile (frame redimensionado ou fundo vazio) com o nome da câmera"""
+        tile_width, tile_height = self.tile_size
+        x = (index % self.cols) * tile_width
+        y = (index // self.cols) * tile_height
+
+        if frame is None:
+            canvas[y:y + tile_height, x:x + tile_width] = self.BACKGROUND
+        else:
+            canvas[y:y + tile_height, x:x + tile_width] = cv2.resize(
+                frame, (tile_width, tile_height), interpolation=cv2.INTER_AREA
+            )
+
+        cv2.putText(canvas, self.labels[index], (x + 6, y + tile_height - 8),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1, cv2.LINE_AA)
+
+    def _run(self):
+        """Loop de composição na taxa configurada"""
+        width, height = self.size
+        canvas = np.zeros((height, width, 3), dtype=np.uint8)
+        canvas[:] = self.BACKGROUND
+        tile_seqs = [None] * len(self.hubs)
+        hub_retries = [0] * len(self.hubs)
+        interval = 1.0 / self.fps
+
+        for hub in self.hubs:
+            hub.subscribe()
+
+        print(f"🧩 Mosaico iniciado ({self.cols}x{self.rows}, {len(self.hubs)} câmeras)")
+
+        try:
+            while not self._should_stop(self.idle_timeout):
+                tick_start = time.time()
+
+                # Redesenhar apenas os tiles cujas câmeras publicaram frame novo
+                changed = False
+                for index, hub in enumerate(self.hubs):
+                    # Hub que desistiu de reconectar: tentar de novo, como uma visualização nova faria
+                    if not hub.running and tick_start - hub_retries[index] >= self.HUB_RETRY_INTERVAL:
+                        hub_retries[index] = tick_start
+                        hub.ensure_running()
+                    seq, frame = hub.latest()
+                    if seq != tile_seqs[index]:
+                        self._draw_tile(canvas, index, frame)
+                        tile_seqs[index] = seq
+                        changed = True
+
+                if changed or self.frame is None:
+                    self.publish(canvas.copy())
+
+                delay = interval - (time.time() - tick_start)
+                if delay > 0:
+                    time.sleep(delay)
+        except Exception as e:
+            print(f"❌ Erro no mosaico {self.key}: {e}")
+        finally:
+            for hub in self.hubs:
+                hub.unsubscribe()
+            self._finish()
+            print(f"🛑 Mosaico finalizado ({self.cols}x{self.rows})")
+
+
+class CaptureManager:
+    """Registro dos hubs de captura ativos no processo"""
+
+    def __init__(self):
+        self.hubs = {}
+        self.mosaics = {}
+        self.snapshot_fetches = {}
+        self.lock = threading.Lock()
+
+    def get_hub(self, camera, stream='main'):
+        """Retorna o hub do stream ('main' ou 'sub') da câmera
+
+        Cada stream tem seu próprio hub. Um novo hub é criado se a URL mudou,
+        e o anterior é parado para não manter a conexão à URL antiga.
+        """
+        camera_id = str(camera.id)
+        stream_url = camera.get_stream_url(stream)
+        key = f'{camera_id}:{stream}'
+
+        with self.lock:
+            hub = self.hubs.get(key)
+            if hub is None or hub.stream_url != stream_url:
+                if hub is not None:
+                    hub.stop()
+                hub = CaptureHub(camera_id, stream_url, stream)
+                self.hubs[key] = hub
+            return hub
+
+    def get_mosaic(self, cameras, cols, rows, tile_size, fps):
+        """Retorna o mosaico para o layout pedido, compartilhado entre visualizadores"""
+        cameras = list(cameras)[:cols * rows]
+        hubs = [self.get_hub(camera, camera.get_stream_for('snapshot')) for camera in cameras]
+        key = (tuple(str(camera.id) for camera in cameras), cols, rows, tuple(tile_size), fps)
+
+        with self.lock:
+            mosaic = self.mosaics.get(key)
+            # Recriar se algum hub foi substituído (ex.: URL do stream alterada)
+            if mosaic is None or any(a is not b for a, b in zip(mosaic.hubs, hubs)):
+                mosaic = MosaicHub(key, hubs, [camera.name for camera in cameras], cols, rows, tile_size, fps)
+                self.mosaics[key] = mosaic
+            # Descartar mosaicos de layouts que já terminaram
+            for other_key, other in list(self.mosaics.items()):
+                if other is not mosaic and not other.running:
+                    del self.mosaics[other_key]
+            return mosaic
+
+    def get_snapshot(self, camera, max_age=None, size=DEFAULT_STREAM_SIZE):
+        """Retorna (jpeg, estado) com um frame recente da câmera"""
+        hub, seq, frame, state = self.get_snapshot_frame(camera, max_age)
+        if frame is None:
+            return None, state
+        jpeg = hub.get_jpeg(seq, frame, size)
+        return jpeg, 'ok' if jpeg is not None else 'error'
+
+    def get_snapshot_frame(self, camera, max_age=None):
+        """Retorna (hub, seq, frame, estado) com um frame recente da câmera
+
+        Usa o stream configurado para snapshots (substream por padrão) e o
+        último frame decodificado pelo hub quando ele tem no máximo
+        max_age segundos. Caso contrário, faz uma única captura avulsa por
+        câmera: requisições simultâneas aguardam a mesma busca em andamento.
+        """
+        if max_age is None:
+            max_age = settings.DVR_SETTINGS.get('SNAPSHOT_MAX_AGE', 5)
+
+        hub = self.get_hub(camera, camera.get_stream_for('snapshot'))
+        seq, frame = hub.get_recent_frame(max_age)
+        if frame is not None:
+            return hub, seq, frame, 'ok'
+
+        # Falha recente: evitar reconectar a cada requisição do dashboard
+        error = hub.get_recent_error(max_age)
+        if error:
+            return hub, None, None, error
+
+        with self.lock:
+            fetch = self.snapshot_fetches.get(hub.key)
+            owner = fetch is None
+            if owner:
+                fetch = threading.Event()
+                self.snapshot_fetches[hub.key] = fetch
+
+        if owner:
+            try:
+                state = hub.capture_single_frame()
+            finally:
+                with self.lock:
+                    self.snapshot_fetches.pop(hub.key, None)
+                fetch.set()
+        else:
+            fetch.wait(timeout=15)
+            state = hub.get_recent_error(max_age) or 'ok'
+
+        if state != 'ok':
+            return hub, None, None, state
+
+        seq, frame = hub.get_recent_frame(max_age)
+        return hub, seq, frame, 'ok' if frame is not None else 'no_signal'
+
+    def get_status(self):
+        """Retorna o estado de cada hub ativo"""
+        with self.lock:
+            return {
+                key: {
+                    'running': hub.running,
+                    'subscribers': hub.subscribers,
+                    'frame_seq': hub.frame_seq,
+                }
+                for key, hub in self.hubs.items()
+            }
+
+    def stop_all(self):
+        """Para todos os hubs"""
+        with self.lock:
+            for mosaic in self.mosaics.values():
+                mosaic.stop()
+            for hub in self.hubs.values():
+                hub.stop()
+            self.mosaics.clear()
+            self.hubs.clear()
+
+
+# Instância global dos hubs de captura
+capture_manager = CaptureManager()
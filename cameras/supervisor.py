@@ -0,0 +1,364 @@
+import multiprocessing
+import os
+import queue
+import random
+import signal
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+
+
+# Intervalo entre relatórios de carga enviados por cada shard (segundos)
+REPORT_INTERVAL = 5
+
+
+def get_shutdown_timeout():
+    """Prazo para um shard fechar incidentes e buffers ao parar (segundos)"""
+    return settings.DVR_SETTINGS.get('DETECTION_SHUTDOWN_TIMEOUT', 30)
+
+
+class ReconnectBackoff:
+    """Espera entre reconexões de uma câmera: exponencial com jitter
+
+    A n-ésima falha seguida espera um valor sorteado entre metade e o total
+    de min(base * 2^n, maximum), então câmeras que caíram juntas (queda de
+    rede, shard reiniciado) não voltam a conectar todas no mesmo instante.
+    Uma conexão que durou reset_after segundos volta a contagem ao início.
+    """
+
+    def __init__(self, base=1, maximum=60, reset_after=None):
+        self.base = base
+        self.maximum = maximum
+        self.reset_after = maximum if reset_after is None else reset_after
+        self.failures = 0
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            base=settings.DVR_SETTINGS.get('DETECTION_RECONNECT_MIN', 1),
+            maximum=settings.DVR_SETTINGS.get('DETECTION_RECONNECT_MAX', 60),
+        )
+
+    def next_delay(self, uptime=0):
+        """Segundos até a próxima tentativa; uptime é a duração da conexão que caiu"""
+        if uptime >= self.reset_after:
+            self.failures = 0
+        delay = min(self.maximum, self.base * 2 ** min(self.failures, 16))
+        self.failures += 1
+        return random.uniform(delay / 2, delay)
+
+
+def shard_main(shard_index, commands, reports):
+    """Processo de detecção: roda um MotionDetector com as câmeras atribuídas
+
+    Recebe ('add', camera_id), ('remove', camera_id) ou ('stop', None) pela
+    fila de comandos e envia periodicamente um relatório de carga. Ao parar
+    espera os workers fecharem incidentes e buffers antes de sair.
+    """
+    import django
+    django.setup()
+    from cameras.motion_detection import MotionDetector
+
+    # Ctrl+C chega a todo o grupo de processos: quem encerra os shards é o supervisor.
+    # SIGTERM (ex.: systemd parando o serviço inteiro) vira uma parada ordenada.
+    terminated = []
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: terminated.append(True))
+
+    detector = MotionDetector()
+    parent_pid = os.getppid()
+    last_report = time.time()
+    last_cpu = time.process_time()
+    last_frames = {}
+    print(f"🧩 Shard de detecção {shard_index} iniciado (pid {os.getpid()})")
+
+    while True:
+        try:
+            command, camera_id = commands.get(timeout=1)
+        except queue.Empty:
+            command, camera_id = None, None
+
+        if command == 'add':
+            detector.start_detection_for_camera(camera_id)
+        elif command == 'remove':
+            detector.stop_detection_for_camera(camera_id)
+            detector.detection_threads.pop(camera_id, None)
+        elif command == 'stop' or terminated or os.getppid() != parent_pid:
+            # Parada pedida ou supervisor morreu
+            detector.shutdown(timeout=get_shutdown_timeout())
+            break
+
+        now = time.time()
+        if now - last_report >= REPORT_INTERVAL:
+            cameras = detector.get_camera_stats()
+            cpu = time.process_time()
+            # Por câmera, para que remover uma câmera não gere fps negativo
+            frames = {camera_id: camera['frames'] for camera_id, camera in cameras.items()}
+            new_frames = sum(count - last_frames.get(camera_id, 0) for camera_id, count in frames.items())
+            elapsed = now - last_report
+            reports.put({
+                'shard': shard_index,
+                'pid': os.getpid(),
+                'time': now,
+                'cpu_percent': round((cpu - last_cpu) / elapsed * 100, 1),
+                'fps': round(new_frames / elapsed, 1),
+                'cameras': cameras,
+            })
+            last_report, last_cpu, last_frames = now, cpu, frames
+
+    print(f"🛑 Shard de detecção {shard_index} finalizado")
+
+
+class DetectionShard:
+    """Um processo de detecção e as câmeras atribuídas a ele"""
+
+    def __init__(self, index, context, reports):
+        self.index = index
+        self.commands = context.Queue()
+        self.process = context.Process(
+            target=shard_main,
+            args=(index, self.commands, reports),
+            name=f'dvr-detection-{index}',
+            daemon=True,
+        )
+        self.cameras = set()
+        self.report = None
+
+    def start(self):
+        self.process.start()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def send(self, command, camera_id=None):
+        self.commands.put((command, camera_id))
+
+    def cpu_percent(self):
+        return self.report['cpu_percent'] if self.report else 0
+
+    def is_recording(self, camera_id):
+        """Se o último relatório indica gravação de incidente em curso na câmera"""
+        camera = (self.report or {}).get('cameras', {}).get(camera_id)
+        return bool(camera and camera['recording'])
+
+
+class DetectionSupervisor:
+    """Distribui as câmeras entre processos de detecção, um por núcleo
+
+    Cada processo roda as threads de detecção das suas câmeras sem disputar
+    o GIL com os demais. O supervisor sincroniza periodicamente com as
+    câmeras ativas no banco, atribui câmeras novas ao shard menos carregado,
+    move câmeras quando a divisão fica desigual e reinicia shards que morrerem.
+    """
+
+    def __init__(self):
+        # spawn: os shards não herdam conexões de banco nem threads do pai
+        self.context = multiprocessing.get_context('spawn')
+        self.reports = None
+        self.shards = []
+        self.assignments = {}
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        # Câmeras deste processo quando um DetectionDaemon divide a frota (None = todas)
+        self.camera_ids = None
+
+    def max_shards(self):
+        workers = settings.DVR_SETTINGS.get('DETECTION_WORKERS', 0)
+        return workers if workers > 0 else (os.cpu_count() or 1)
+
+    def start(self):
+        """Inicia o supervisor e distribui as câmeras online"""
+        with self.lock:
+            if self.running:
+                return f"Detecção já ativa em {len(self.shards)} processos"
+            self.running = True
+            self.reports = self.context.Queue()
+            self.thread = threading.Thread(target=self._supervise, daemon=True)
+            self.thread.start()
+
+        self.sync()
+        print(f"✅ Detecção iniciada para {len(self.assignments)} câmeras em {len(self.shards)} processos")
+        return f"Detecção iniciada para {len(self.assignments)} câmeras"
+
+    def stop(self):
+        """Para todos os shards"""
+        with self.lock:
+            if not self.running:
+                return "Detecção parada para 0 câmeras"
+            self.running = False
+            stopped_count = len(self.assignments)
+            for shard in self.shards:
+                shard.send('stop')
+            # Margem além do prazo de limpeza do shard antes de forçar o término
+            deadline = time.time() + get_shutdown_timeout() + 10
+            for shard in self.shards:
+                shard.process.join(timeout=max(0, deadline - time.time()))
+                if shard.is_alive():
+                    shard.process.terminate()
+            self.shards = []
+            self.assignments = {}
+
+        print(f"🛑 Detecção parada para {stopped_count} câmeras")
+        return f"Detecção parada para {stopped_count} câmeras"
+
+    def _new_shard(self, index):
+        shard = DetectionShard(index, self.context, self.reports)
+        shard.start()
+        return shard
+
+    def _assign(self, camera_id, shard):
+        self.assignments[camera_id] = shard.index
+        shard.cameras.add(camera_id)
+        shard.send('add', camera_id)
+
+    def _unassign(self, camera_id):
+        index = self.assignments.pop(camera_id, None)
+        if index is None:
+            return
+        shard = self.shards[index]
+        shard.cameras.discard(camera_id)
+        shard.send('remove', camera_id)
+
+    def sync(self):
+        """Sincroniza as atribuições com as câmeras que devem ser monitoradas"""
+        # Import tardio: os shards importam este módulo antes do django.setup()
+        from .models import Camera
+
+        close_old_connections()
+        wanted = {
+            str(camera_id)
+            for camera_id in Camera.objects.filter(status='online', is_active=True).values_list('id', flat=True)
+        }
+        camera_ids = self.camera_ids
+        if camera_ids is not None:
+            wanted &= camera_ids
+
+        with self.lock:
+            if not self.running:
+                return
+
+            # Reiniciar shards mortos; suas câmeras voltam a ser distribuídas
+            for index, shard in enumerate(self.shards):
+                if not shard.is_alive():
+                    print(f"⚠️ Shard de detecção {index} morreu, reiniciando")
+                    for camera_id in shard.cameras:
+                        self.assignments.pop(camera_id, None)
+                    self.shards[index] = self._new_shard(index)
+
+            for camera_id in list(self.assignments):
+                if camera_id not in wanted:
+                    self._unassign(camera_id)
+
+            # Crescer o pool até um shard por núcleo (nunca mais shards que câmeras)
+            target = min(self.max_shards(), max(1, len(wanted)))
+            while len(self.shards) < target:
+                self.shards.append(self._new_shard(len(self.shards)))
+
+            # Câmeras novas vão para o shard com menos câmeras (desempate: CPU)
+            for camera_id in sorted(wanted - set(self.assignments)):
+                shard = min(self.shards, key=lambda s: (len(s.cameras), s.cpu_percent()))
+                self._assign(camera_id, shard)
+
+            self._rebalance()
+
+    def _rebalance(self):
+        """Move câmeras do shard mais cheio para o mais vazio até a diferença ser ≤ 1
+
+        Câmeras gravando um incidente ficam onde estão: mover fecharia a
+        gravação no meio do evento. Elas são movidas numa sincronização
+        seguinte, quando o incidente terminar.
+        """
+        while True:
+            fullest = max(self.shards, key=lambda s: len(s.cameras))
+            emptiest = min(self.shards, key=lambda s: len(s.cameras))
+            if len(fullest.cameras) - len(emptiest.cameras) <= 1:
+                return
+            movable = [camera_id for camera_id in sorted(fullest.cameras) if not fullest.is_recording(camera_id)]
+            if not movable:
+                return
+            camera_id = movable[0]
+            print(f"🔀 Movendo câmera {camera_id} do shard {fullest.index} para o {emptiest.index}")
+            self._unassign(camera_id)
+            self._assign(camera_id, emptiest)
+
+    def _supervise(self):
+        """Recebe relatórios dos shards e sincroniza periodicamente"""
+        interval = settings.DVR_SETTINGS.get('DETECTION_REBALANCE_INTERVAL', 10)
+        last_sync = time.time()
+        while self.running:
+            try:
+                report = self.reports.get(timeout=1)
+                with self.lock:
+                    if report['shard'] < len(self.shards):
+                        self.shards[report['shard']].report = report
+            except queue.Empty:
+                pass
+            except Exception as e:
+                print(f"❌ Erro ao ler relatório de detecção: {e}")
+
+            if time.time() - last_sync >= interval:
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"❌ Erro ao sincronizar câmeras da detecção: {e}")
+                last_sync = time.time()
+
+    def get_status(self):
+        """Status agregado e carga de cada shard"""
+        with self.lock:
+            shards = []
+            active_cameras = []
+            camera_rates = []
+            recording_cameras = 0
+            now = time.time()
+            for shard in self.shards:
+                report = shard.report or {}
+                cameras = report.get('cameras', {})
+                # Idades e uptime no relatório são do momento em que foi enviado
+                report_age = now - report['time'] if report else 0
+                for camera_id in shard.cameras:
+                    camera = cameras.get(camera_id)
+                    if camera and camera['running']:
+                        active_cameras.append(camera['name'])
+                        recording_cameras += camera['recording']
+                        camera_rates.append({
+                            'id': camera_id,
+                            'name': camera['name'],
+                            'shard': shard.index,
+                            'analysis_fps': camera['analysis_fps'],
+                            'sampling': camera['sampling'],
+                            'recording': camera['recording'],
+                            'state': camera['state'],
+                            'uptime': round(camera['uptime'] + report_age, 1) if camera['uptime'] else 0,
+                            'reconnects': camera['reconnects'],
+                            'last_frame_age': (
+                                round(camera['last_frame_age'] + report_age, 1)
+                                if camera['last_frame_age'] is not None else None
+                            ),
+                        })
+                shards.append({
+                    'shard': shard.index,
+                    'pid': shard.process.pid,
+                    'alive': shard.is_alive(),
+                    'cameras': len(shard.cameras),
+                    'cpu_percent': report.get('cpu_percent', 0),
+                    'fps': report.get('fps', 0),
+                    'report_age': round(report_age, 1) if report else None,
+                })
+
+            return {
+                'active_cameras': sorted(active_cameras),
+                'total_active': len(active_cameras),
+                'recording_cameras': recording_cameras,
+                'assigned_cameras': len(self.assignments),
+                'cameras': sorted(camera_rates, key=lambda camera: camera['name']),
+                'idle_cameras': sum(camera['sampling'] == 'idle' for camera in camera_rates),
+                'reconnecting_cameras': sum(camera['state'] != 'streaming' for camera in camera_rates),
+                'shards': shards,
+            }
+
+
+# Instância global do supervisor de detecção
+detection_supervisor = DetectionSupervisor()
@@ -2,6 +2,7 @@ from celery import shared_task
 from cameras.models import Camera
 from recordings.models import Recording, MotionEvent
 from django.utils import timezone
+from django.conf import settings
 import requests
 import socket
 import cv2
@@ -12,6 +13,10 @@ from datetime import timedelta
 import threading
 import queue
 
+from .events import event_bus
+from .detection import AdaptiveSampler, MotionMetrics, MotionTrigger, create_pipeline
+from .frame_sources import create_frame_source
+
 
 @shared_task
 def check_camera_status_task(camera_id=None):
@@ -48,16 +53,12 @@ def check_single_camera_status(camera):
         
         # Atualizar status se mudou
         if camera.status != new_status:
-            camera.status = new_status
-            if new_status == 'online':
-                camera.last_seen = timezone.now()
-            camera.save()
+            camera.update_status(new_status)
             
     except Exception as e:
         # Em caso de erro, marcar como offline
         if camera.status != 'offline':
-            camera.status = 'offline'
-            camera.save()
+            camera.update_status('offline')
 
 
 def check_network_connectivity(ip, port, timeout=3):
@@ -177,66 +178,56 @@ def motion_detection_worker(camera_id):
     try:
         camera = Camera.objects.get(id=camera_id)
         
-        # Configurações de detecção
-        motion_threshold = 5000  # Sensibilidade
-        min_motion_frames = 3    # Frames mínimos para confirmar movimento
-        motion_frames = 0
-        last_frame = None
-        
-        # Conectar ao stream
-        cap = cv2.VideoCapture(camera.stream_url)
-        if not cap.isOpened():
+        # Parâmetros de detecção vêm do CameraSettings da câmera
+        pipeline = create_pipeline(camera)
+        trigger = MotionTrigger(pipeline.params.min_motion_frames)
+        sampler = AdaptiveSampler.from_settings()
+        metrics = MotionMetrics()
+        confirm_window = settings.DVR_SETTINGS.get('MOTION_CONFIRM_WINDOW', 10)
+        min_peak_ratio = settings.DVR_SETTINGS.get('MOTION_MIN_PEAK_RATIO', 0.0)
+        min_confidence = settings.DVR_SETTINGS.get('MOTION_MIN_CONFIDENCE', 0.0)
+        
+        # Conectar ao stream de detecção (substream quando configurado)
+        source = create_frame_source(camera, pipeline)
+        if not source.open():
             print(f"Não foi possível conectar ao stream da câmera {camera.name}")
             return
         
         print(f"Iniciando detecção de movimento para {camera.name}")
         
         while motion_detection_active.get(camera_id, False):
-            ret, frame = cap.read()
-            if not ret:
+            if not sampler.should_analyse():
+                # Cena parada: descartar frames fora da taxa de análise
+                source.skip()
                 continue
             
-            # Converter para escala de cinza
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            gray = cv2.GaussianBlur(gray, (21, 21), 0)
-            
-            if last_frame is None:
-                last_frame = gray
+            ret, frame = source.read()
+            if not ret:
                 continue
             
-            # Calcular diferença entre frames
-            frame_delta = cv2.absdiff(last_frame, gray)
-            thresh = cv2.threshold(frame_delta, 25, 255, cv2.THRESH_BINARY)[1]
-            
-            # Dilatar para preencher buracos
-            thresh = cv2.dilate(thresh, None, iterations=2)
-            
-            # Encontrar contornos
-            contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # Verificar movimento
-            motion_detected = False
-            for contour in contours:
-                if cv2.contourArea(contour) > motion_threshold:
-                    motion_detected = True
-                    break
-            
-            if motion_detected:
-                motion_frames += 1
-                if motion_frames >= min_motion_frames:
-                    # Movimento confirmado - iniciar gravação
-                    print(f"Movimento detectado em {camera.name}!")
-                    start_recording.delay(camera_id)
-                    motion_frames = 0
-            else:
-                motion_frames = 0
-            
-            last_frame = gray
-            
-            # Pequena pausa para não sobrecarregar
-            time.sleep(0.1)
-        
-        cap.release()
+            result = pipeline.process(frame, source.source_size)
+            sampler.update(result, pipeline.params.min_area)
+            # Medidas desde o primeiro frame com movimento
+            if result.motion or metrics.frames:
+                metrics.add(result)
+            if metrics.quiet_frames >= confirm_window:
+                metrics = MotionMetrics()
+            if trigger.update(result.motion) == 'confirmed':
+                if metrics.is_weak(min_peak_ratio=min_peak_ratio, min_confidence=min_confidence):
+                    print(f"Movimento fraco ignorado em {camera.name} (confiança {metrics.confidence:.2f})")
+                    metrics = MotionMetrics()
+                    continue
+                # Movimento confirmado - iniciar gravação
+                print(f"Movimento detectado em {camera.name}!")
+                event_bus.publish(
+                    'motion', camera.id, camera_name=camera.name,
+                    area=result.source_area(), bbox=result.bbox,
+                    ratio=round(metrics.peak_ratio, 5),
+                )
+                start_recording.delay(camera_id, result.source_area(), metrics.to_dict())
+                metrics = MotionMetrics()
+        
+        source.release()
         print(f"Detecção de movimento parada para {camera.name}")
         
     except Exception as e:
@@ -245,8 +236,11 @@ def motion_detection_worker(camera_id):
 
 
 @shared_task
-def start_recording(camera_id):
-    """Inicia gravação para uma câmera"""
+def start_recording(camera_id, area_affected=0, metrics=None):
+    """Inicia gravação para uma câmera
+
+    metrics são as medidas do detector (MotionMetrics.to_dict()) para o evento.
+    """
     try:
         camera = Camera.objects.get(id=camera_id)
         
@@ -273,11 +267,12 @@ def start_recording(camera_id):
         )
         
         # Criar evento de movimento
+        fields = {'area_affected': area_affected}
+        fields.update(metrics or {})
         motion_event = MotionEvent.objects.create(
             camera=camera,
             recording=recording,
-            confidence=0.8,
-            area_affected=1000
+            **fields
         )
         
         # Iniciar thread de gravação
@@ -295,6 +290,7 @@ def start_recording(camera_id):
         )
         thread.start()
         
+        event_bus.publish('recording_started', camera.id, recording_id=recording.id, recording_type='motion')
         print(f"Gravação iniciada: {filepath}")
         return f"Gravação iniciada para {camera.name}"
         
@@ -359,6 +355,7 @@ def recording_worker(camera_id, filepath):
         recording_threads[camera_id]['active'] = False
         del recording_threads[camera_id]
         
+        event_bus.publish('recording_stopped', camera.id, recording_id=recording.id, success=True)
         print(f"Gravação finalizada: {filepath}")
         
     except Exception as e:
@@ -1,4 +1,5 @@
 from django.urls import path
+from django.conf import settings
 from . import views
 
 app_name = 'cameras'
@@ -14,11 +15,23 @@ urlpatterns = [
     path('<uuid:camera_id>/edit/', views.camera_edit, name='camera_edit'),
     path('<uuid:camera_id>/delete/', views.camera_delete, name='camera_delete'),
     path('<uuid:camera_id>/settings/', views.camera_settings, name='camera_settings'),
+    path('<uuid:camera_id>/masks/add/', views.camera_mask_create, name='camera_mask_create'),
+    path('<uuid:camera_id>/masks/<int:mask_id>/delete/', views.camera_mask_delete, name='camera_mask_delete'),
     
     # Visualização ao vivo
     path('<uuid:camera_id>/live/', views.camera_live_view, name='camera_live_view'),
-    path('<uuid:camera_id>/stream/', views.camera_stream, name='camera_stream'),
+    path('<uuid:camera_id>/stream/',
+         views.camera_stream_async if settings.DVR_SETTINGS['ASYNC_STREAMING'] else views.camera_stream,
+         name='camera_stream'),
     path('<uuid:camera_id>/snapshot/', views.camera_snapshot, name='camera_snapshot'),
+    path('mosaic/stream/', views.camera_mosaic_stream, name='camera_mosaic_stream'),
+    path('thumbnails/', views.camera_thumbnails, name='camera_thumbnails'),
+    path('thumbnails/sprite.jpg', views.camera_thumbnail_sprite, name='camera_thumbnail_sprite'),
+    path('events/',
+         views.camera_events_async if settings.DVR_SETTINGS['ASYNC_STREAMING'] else views.camera_events,
+         name='camera_events'),
+    path('<uuid:camera_id>/hls/index.m3u8', views.camera_hls_playlist, name='camera_hls_playlist'),
+    path('<uuid:camera_id>/hls/<str:segment>', views.camera_hls_segment, name='camera_hls_segment'),
     
     # Descoberta de câmeras
     path('discovery/', views.camera_discovery, name='camera_discovery'),
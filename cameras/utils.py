@@ -7,49 +7,27 @@ from datetime import datetime
 from django.conf import settings
 import ffmpeg
 
+from .detection import MotionPipeline, create_pipeline
+from .frame_sources import create_frame_source
+
 
 class MotionDetector:
-    """Classe para detecção de movimento em streams de vídeo"""
+    """Classe para detecção de movimento em streams de vídeo
     
-    def __init__(self, sensitivity=0.3, min_area=500):
-        self.sensitivity = sensitivity
-        self.min_area = min_area
-        self.background_subtractor = cv2.createBackgroundSubtractorMOG2(
-            history=100, varThreshold=50, detectShadows=False
-        )
-        self.previous_frame = None
+    O processamento dos frames é feito pelo MotionPipeline compartilhado;
+    esta classe só acrescenta o estado de movimento com timeout e delay.
+    """
+    
+    def __init__(self, params=None, motion_timeout=4, motion_start_delay=10, pipeline=None):
+        self.pipeline = pipeline or MotionPipeline(params)
         self.motion_detected = False
         self.motion_start_time = None
-        self.motion_timeout = 4  # segundos
-        self.motion_start_delay = 10  # segundos
+        self.motion_timeout = motion_timeout  # segundos
+        self.motion_start_delay = motion_start_delay  # segundos
         
-    def detect_motion(self, frame):
+    def detect_motion(self, frame, source_size=None):
         """Detecta movimento em um frame"""
-        # Converter para escala de cinza
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (21, 21), 0)
-        
-        # Se não temos frame anterior, usar o atual
-        if self.previous_frame is None:
-            self.previous_frame = gray
-            return False
-        
-        # Calcular diferença entre frames
-        frame_delta = cv2.absdiff(self.previous_frame, gray)
-        thresh = cv2.threshold(frame_delta, 25, 255, cv2.THRESH_BINARY)[1]
-        
-        # Dilatar a imagem para preencher buracos
-        thresh = cv2.dilate(thresh, None, iterations=2)
-        
-        # Encontrar contornos
-        contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Verificar se há movimento significativo
-        motion_detected = False
-        for contour in contours:
-            if cv2.contourArea(contour) > self.min_area:
-                motion_detected = True
-                break
+        motion_detected = self.pipeline.process(frame, source_size).motion
         
         # Atualizar estado de movimento
         current_time = time.time()
@@ -65,9 +43,6 @@ class MotionDetector:
                     self.motion_detected = False
                     self.motion_start_time = None
         
-        # Atualizar frame anterior
-        self.previous_frame = gray
-        
         return self.motion_detected
     
     def should_start_recording(self):
@@ -84,8 +59,9 @@ class StreamProcessor:
         self.camera = camera
         self.settings = settings
         self.motion_detector = MotionDetector(
-            sensitivity=settings.motion_sensitivity,
-            min_area=1000
+            pipeline=create_pipeline(camera),
+            motion_timeout=settings.motion_timeout,
+            motion_start_delay=settings.motion_start_delay
         )
         self.is_recording = False
         self.recording_thread = None
@@ -106,20 +82,20 @@ class StreamProcessor:
         
     def _process_stream(self):
         """Processa o stream em loop"""
-        cap = cv2.VideoCapture(self.camera.get_stream_url())
+        source = create_frame_source(self.camera, self.motion_detector.pipeline)
         
-        if not cap.isOpened():
+        if not source.open():
             print(f"Erro ao abrir stream da câmera {self.camera.name}")
             return
         
         try:
             while not self.stop_processing:
-                ret, frame = cap.read()
+                ret, frame = source.read()
                 if not ret:
                     break
                 
                 # Detectar movimento
-                motion_detected = self.motion_detector.detect_motion(frame)
+                motion_detected = self.motion_detector.detect_motion(frame, source.source_size)
                 
                 # Verificar se deve iniciar gravação
                 if motion_detected and self.motion_detector.should_start_recording():
@@ -131,10 +107,11 @@ class StreamProcessor:
                     self.stop_recording()
                 
                 # Pequena pausa para não sobrecarregar
-                time.sleep(0.1)
+                if not source.paced:
+                    time.sleep(0.1)
                 
         finally:
-            cap.release()
+            source.release()
     
     def start_recording(self):
         """Inicia gravação do stream"""
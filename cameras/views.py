@@ -1,11 +1,16 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib import messages
-from django.http import JsonResponse, StreamingHttpResponse, HttpResponse
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponse, HttpResponseNotModified, FileResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 from django.db.models import Q
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from asgiref.sync import sync_to_async
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -15,14 +20,22 @@ import numpy as np
 import threading
 import time
 import json
+import re
+import math
+import asyncio
 from datetime import datetime, timedelta
 import requests
 from wsdiscovery import WSDiscovery
 from onvif import ONVIFCamera
 
-from .models import Camera, CameraSettings, CameraDiscovery
-from .forms import CameraForm, CameraSettingsForm
+from .models import Camera, CameraSettings, CameraMask, CameraDiscovery
+from .forms import CameraForm, CameraSettingsForm, CameraMaskForm
 from .utils import MotionDetector, StreamProcessor, ONVIFDiscovery
+from .streaming import capture_manager
+from .placeholders import get_placeholder_jpeg
+from .hls import hls_manager
+from .sprites import sprite_cache
+from .events import event_bus, event_stream, async_event_stream
 from cameras.motion_detection import start_motion_detection, stop_motion_detection, get_detection_status
 
 
@@ -153,15 +166,49 @@ def camera_settings(request, camera_id):
     else:
         form = CameraSettingsForm(instance=settings)
     
+    masks = camera.masks.all()
     context = {
         'form': form,
         'camera': camera,
         'settings': settings,
+        'masks': masks,
+        'masks_data': [
+            {'name': mask.name, 'mask_type': mask.mask_type, 'points': mask.points, 'is_active': mask.is_active}
+            for mask in masks
+        ],
+        'mask_form': CameraMaskForm(),
     }
     
     return render(request, 'cameras/camera_settings.html', context)
 
 
+@login_required
+@require_http_methods(["POST"])
+def camera_mask_create(request, camera_id):
+    """Adicionar máscara de detecção (polígono normalizado)"""
+    camera = get_object_or_404(Camera, id=camera_id)
+    form = CameraMaskForm(request.POST)
+    if form.is_valid():
+        mask = form.save(commit=False)
+        mask.camera = camera
+        mask.save()
+        messages.success(request, f'Máscara "{mask.name}" adicionada. Reinicie a detecção para aplicá-la.')
+    else:
+        errors = '; '.join(error for field_errors in form.errors.values() for error in field_errors)
+        messages.error(request, f'Erro ao adicionar máscara: {errors}')
+    return redirect('cameras:camera_settings', camera_id=camera.id)
+
+
+@login_required
+@require_http_methods(["POST"])
+def camera_mask_delete(request, camera_id, mask_id):
+    """Excluir máscara de detecção"""
+    mask = get_object_or_404(CameraMask, id=mask_id, camera_id=camera_id)
+    mask.delete()
+    messages.success(request, f'Máscara "{mask.name}" excluída.')
+    return redirect('cameras:camera_settings', camera_id=camera_id)
+
+
 @login_required
 def camera_live_view(request, camera_id):
     """Visualização ao vivo de uma câmera"""
@@ -174,110 +221,321 @@ def camera_live_view(request, camera_id):
     return render(request, 'cameras/camera_live_view.html', context)
 
 
-def camera_stream(request, camera_id):
-    """Stream de vídeo da câmera"""
-    camera = get_object_or_404(Camera, id=camera_id)
+def parse_int_param(request, name, default, min_value, max_value):
+    """Lê um parâmetro inteiro da query string limitado a [min_value, max_value]"""
+    try:
+        value = int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    return min(max(value, min_value), max_value)
+
+
+def mjpeg_frames(broadcaster, size, quality, min_interval):
+    """Gera as partes multipart de um stream MJPEG a partir de um hub
+    
+    Cada cliente recebe sempre o frame mais recente: um cliente lento pula
+    frames em vez de acumular atraso, sem afetar a captura compartilhada.
+    """
+    last_seq = 0
+    next_frame_time = 0
+    
+    with broadcaster.subscription():
+        while True:
+            # Limitar a taxa deste cliente sem afetar a captura compartilhada
+            delay = next_frame_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            
+            seq, frame_bytes = broadcaster.wait_for_jpeg(last_seq, size=size, quality=quality)
+            if frame_bytes is None:
+                if not broadcaster.running:
+                    break
+                continue
+            
+            last_seq = seq
+            next_frame_time = time.time() + min_interval
+            
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+
+
+async def async_mjpeg_frames(broadcaster, size, quality, min_interval):
+    """Versão assíncrona de mjpeg_frames"""
+    last_seq = 0
+    next_frame_time = 0
     
-    def generate_frames():
-        cap = cv2.VideoCapture(camera.get_stream_url())
-        
-        if not cap.isOpened():
-            return
-        
-        try:
-            while True:
-                ret, frame = cap.read()
-                if not ret:
+    broadcaster.subscribe()
+    try:
+        while True:
+            delay = next_frame_time - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            
+            seq, frame_bytes = await broadcaster.async_wait_for_jpeg(last_seq, size=size, quality=quality)
+            if frame_bytes is None:
+                if not broadcaster.running:
                     break
-                
-                # Redimensionar frame para melhor performance
-                frame = cv2.resize(frame, (640, 480))
-                
-                # Converter para JPEG
-                ret, buffer = cv2.imencode('.jpg', frame)
-                if not ret:
-                    continue
-                
-                frame_bytes = buffer.tobytes()
-                
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                
-        finally:
-            cap.release()
+                continue
+            
+            last_seq = seq
+            next_frame_time = time.time() + min_interval
+            
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    finally:
+        broadcaster.unsubscribe()
+
+
+def mjpeg_response(frames):
+    """StreamingHttpResponse multipart para um gerador de frames MJPEG"""
+    response = StreamingHttpResponse(frames, content_type='multipart/x-mixed-replace; boundary=frame')
+    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def parse_stream_options(request):
+    """Lê ?width=, ?quality= e ?fps= e retorna (size, quality, min_interval)"""
+    size = parse_output_size(request)
+    quality = parse_int_param(request, 'quality', settings.DVR_SETTINGS.get('LIVE_JPEG_QUALITY', 80), 20, 95)
+    max_fps = parse_int_param(request, 'fps', 0, 0, 30)
+    min_interval = 1.0 / max_fps if max_fps else 0
+    return size, quality, min_interval
+
+
+def get_live_stream_choice(request, camera):
+    """Stream pedido em ?stream=main|sub ou o configurado para visualização ao vivo"""
+    stream = request.GET.get('stream')
+    if stream in ('main', 'sub'):
+        return stream
+    return camera.get_stream_for('live_view')
+
+
+def camera_stream(request, camera_id):
+    """Stream de vídeo da câmera
+    
+    Parâmetros opcionais: ?stream=main|sub, ?fps= (taxa máxima), ?width= e
+    ?quality= (JPEG). Todos os visualizadores compartilham a mesma conexão e
+    codificação.
+    """
+    camera = get_object_or_404(Camera.objects.select_related('settings'), id=camera_id)
+    hub = capture_manager.get_hub(camera, get_live_stream_choice(request, camera))
+    size, quality, min_interval = parse_stream_options(request)
+    
+    return mjpeg_response(mjpeg_frames(hub, size, quality, min_interval))
+
+
+async def camera_stream_async(request, camera_id):
+    """Versão ASGI de camera_stream
+    
+    Cada visualizador é apenas uma corrotina aguardando o hub, então centenas
+    de conexões longas cabem em um único processo.
+    """
+    try:
+        camera = await Camera.objects.select_related('settings').aget(id=camera_id)
+    except Camera.DoesNotExist:
+        raise Http404("Câmera não encontrada")
+    hub = capture_manager.get_hub(camera, get_live_stream_choice(request, camera))
+    size, quality, min_interval = parse_stream_options(request)
+    
+    return mjpeg_response(async_mjpeg_frames(hub, size, quality, min_interval))
+
+
+def parse_camera_selection(request, cameras):
+    """Lê ?cameras=id1,id2,... mantendo a ordem pedida (padrão: todas do queryset)"""
+    camera_ids = [c for c in request.GET.get('cameras', '').split(',') if c]
+    if not camera_ids:
+        return list(cameras)
+    try:
+        selected = {str(camera.id): camera for camera in cameras.filter(id__in=camera_ids)}
+    except ValidationError:
+        raise Http404("Câmera inválida")
+    return [selected[c] for c in camera_ids if c in selected]
+
+
+@login_required
+def camera_mosaic_stream(request):
+    """Mosaico N×M de várias câmeras composto no servidor em um único stream MJPEG
     
-    return StreamingHttpResponse(generate_frames(), content_type='multipart/x-mixed-replace; boundary=frame')
+    Parâmetros: ?cameras=id1,id2,... (padrão: câmeras ativas), ?cols=, ?rows=,
+    ?tile_width= (altura 4:3), ?fps= e ?quality=.
+    """
+    cameras = parse_camera_selection(
+        request, Camera.objects.filter(is_active=True).select_related('settings').order_by('name')
+    )
+    
+    if not cameras:
+        raise Http404("Nenhuma câmera ativa")
+    
+    # Layout padrão: grade quase quadrada com todas as câmeras
+    default_cols = math.ceil(math.sqrt(len(cameras)))
+    cols = parse_int_param(request, 'cols', default_cols, 1, 8)
+    rows = parse_int_param(request, 'rows', math.ceil(len(cameras) / cols), 1, 8)
+    tile_width = parse_int_param(request, 'tile_width', 320, 80, 960)
+    tile_width -= tile_width % 4
+    tile_size = (tile_width, tile_width * 3 // 4)
+    fps = parse_int_param(request, 'fps', 5, 1, 15)
+    quality = parse_int_param(request, 'quality', settings.DVR_SETTINGS.get('LIVE_JPEG_QUALITY', 80), 20, 95)
+    
+    mosaic = capture_manager.get_mosaic(cameras, cols, rows, tile_size, fps)
+    
+    return mjpeg_response(mjpeg_frames(mosaic, mosaic.size, quality, 0))
+
+
+def get_thumbnail_sprite(request):
+    """Sprite das câmeras pedidas em ?cameras= (padrão: todas) com ?tile_width="""
+    cameras = parse_camera_selection(request, Camera.objects.select_related('settings').order_by('name'))
+    tile_width = parse_int_param(request, 'tile_width', 160, 80, 640)
+    tile_width -= tile_width % 4
+    return sprite_cache.get_sprite(cameras, (tile_width, tile_width * 3 // 4))
+
+
+@login_required
+def camera_thumbnails(request):
+    """Mapa JSON das miniaturas: posição de cada câmera no sprite e URL do sprite
+    
+    Aceita os mesmos parâmetros de camera_thumbnail_sprite, que deve ser
+    chamado com a query string retornada em sprite_url.
+    """
+    sprite = get_thumbnail_sprite(request)
+    
+    data = sprite.to_dict()
+    query = request.GET.copy()
+    query['v'] = sprite.version
+    data['sprite_url'] = f"{reverse('cameras:camera_thumbnail_sprite')}?{query.urlencode()}"
+    return JsonResponse(data)
+
+
+@login_required
+def camera_thumbnail_sprite(request):
+    """Um único JPEG com a miniatura mais recente de cada câmera"""
+    sprite = get_thumbnail_sprite(request)
+    if sprite.jpeg is None:
+        return HttpResponse('Error', status=500)
+    
+    etag = f'"sprite-{sprite.version}"'
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(sprite.jpeg, content_type='image/jpeg')
+    
+    response['ETag'] = etag
+    response['Cache-Control'] = f"private, max-age={settings.DVR_SETTINGS.get('SPRITE_CACHE_SECONDS', 5)}"
+    return response
+
+
+def sse_response(events):
+    """StreamingHttpResponse text/event-stream sem cache nem buffer do proxy"""
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+def camera_events(request):
+    """Eventos em tempo real (SSE): status das câmeras, gravações e movimento
+    
+    Parâmetro opcional: ?camera=<id> para receber apenas uma câmera.
+    Cada conexão ocupa uma thread; com ASYNC_STREAMING use camera_events_async.
+    """
+    return sse_response(event_stream(request.GET.get('camera')))
+
+
+async def camera_events_async(request):
+    """Versão ASGI de camera_events: uma corrotina por navegador conectado"""
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    
+    return sse_response(async_event_stream(request.GET.get('camera')))
+
+
+@login_required
+def camera_hls_playlist(request, camera_id):
+    """Playlist HLS ao vivo (remux do stream da câmera, sem transcodificação)"""
+    camera = get_object_or_404(Camera.objects.select_related('settings'), id=camera_id)
+    session = hls_manager.get_session(camera)
+    
+    if not session.wait_for_playlist():
+        return HttpResponse('Stream HLS indisponível', status=503)
+    
+    with open(session.playlist_path, 'rb') as f:
+        playlist = f.read()
+    
+    response = HttpResponse(playlist, content_type='application/vnd.apple.mpegurl')
+    response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    return response
+
+
+@login_required
+def camera_hls_segment(request, camera_id, segment):
+    """Segmento HLS gerado pelo ffmpeg"""
+    if not re.match(r'^seg_\d+\.ts$', segment):
+        raise Http404("Segmento inválido")
+    
+    session = hls_manager.touch(camera_id)
+    if session is None:
+        raise Http404("Sessão HLS não encontrada")
+    
+    segment_path = session.segment_path(segment)
+    try:
+        # Segmentos são imutáveis depois de escritos
+        response = FileResponse(open(segment_path, 'rb'), content_type='video/mp2t')
+    except FileNotFoundError:
+        raise Http404("Segmento expirado")
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
+
+
+def parse_output_size(request):
+    """Lê a largura pedida (?width=) mantendo a proporção 4:3 da saída"""
+    width = parse_int_param(request, 'width', 640, 80, 1920)
+    width -= width % 4
+    return width, width * 3 // 4
+
+
+def placeholder_response(request, state, size):
+    """Resposta com o placeholder pré-renderizado, revalidada pelo navegador a cada pedido
+
+    O snapshot real usa a mesma URL: com no-cache + ETag o navegador recebe
+    304 enquanto a câmera segue offline e o frame real assim que ela volta.
+    """
+    frame_bytes = get_placeholder_jpeg(state, *size)
+    if frame_bytes is None:
+        return HttpResponse('Error', status=500)
+    
+    etag = f'"placeholder-{state}-{size[0]}x{size[1]}"'
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(frame_bytes, content_type='image/jpeg')
+    
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 def camera_snapshot(request, camera_id):
     """Captura um snapshot da câmera"""
-    camera = get_object_or_404(Camera, id=camera_id)
+    camera = get_object_or_404(Camera.objects.select_related('settings'), id=camera_id)
+    size = parse_output_size(request)
     
     try:
-        cap = cv2.VideoCapture(camera.get_stream_url())
+        # Frame recente do hub ou uma única captura compartilhada entre requisições
+        frame_bytes, state = capture_manager.get_snapshot(camera, size=size)
         
-        if not cap.isOpened():
-            # Retornar imagem placeholder se não conseguir conectar
-            # Criar uma imagem placeholder simples
-            placeholder = np.zeros((480, 640, 3), dtype=np.uint8)
-            placeholder[:] = (128, 128, 128)  # Cinza
-            
-            # Adicionar texto
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            cv2.putText(placeholder, 'Camera Offline', (200, 240), font, 1, (255, 255, 255), 2)
-            cv2.putText(placeholder, 'RTSP Auth Required', (180, 280), font, 0.7, (200, 200, 200), 2)
-            
-            ret, buffer = cv2.imencode('.jpg', placeholder)
-            if ret:
-                response = HttpResponse(buffer.tobytes(), content_type='image/jpeg')
-                response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-                return response
-        
-        ret, frame = cap.read()
-        cap.release()
-        
-        if ret:
-            # Redimensionar frame
-            frame = cv2.resize(frame, (640, 480))
-            
-            # Converter para JPEG
-            ret, buffer = cv2.imencode('.jpg', frame)
-            if ret:
-                response = HttpResponse(buffer.tobytes(), content_type='image/jpeg')
-                response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-                return response
-        
-        # Se não conseguir capturar, retornar placeholder
-        placeholder = np.zeros((480, 640, 3), dtype=np.uint8)
-        placeholder[:] = (128, 128, 128)
-        
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        cv2.putText(placeholder, 'No Signal', (250, 240), font, 1, (255, 255, 255), 2)
-        cv2.putText(placeholder, 'Camera Error', (220, 280), font, 0.7, (200, 200, 200), 2)
-        
-        ret, buffer = cv2.imencode('.jpg', placeholder)
-        if ret:
-            response = HttpResponse(buffer.tobytes(), content_type='image/jpeg')
+        if frame_bytes is not None:
+            response = HttpResponse(frame_bytes, content_type='image/jpeg')
             response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
             return response
+        
+        # 'offline' quando não conecta, 'no_signal' quando não há frame
+        return placeholder_response(request, state, size)
             
     except Exception as e:
-        # Em caso de erro, retornar placeholder
-        placeholder = np.zeros((480, 640, 3), dtype=np.uint8)
-        placeholder[:] = (128, 128, 128)
-        
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        cv2.putText(placeholder, 'Error', (280, 240), font, 1, (255, 255, 255), 2)
-        cv2.putText(placeholder, str(e)[:30], (200, 280), font, 0.5, (200, 200, 200), 1)
-        
-        ret, buffer = cv2.imencode('.jpg', placeholder)
-        if ret:
-            response = HttpResponse(buffer.tobytes(), content_type='image/jpeg')
-            response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-            return response
-    
-    # Fallback
-    return HttpResponse('Error', status=500)
+        print(f"❌ Erro ao capturar snapshot da câmera {camera.name}: {e}")
+        return placeholder_response(request, 'error', size)
 
 
 @login_required
@@ -392,6 +650,8 @@ def api_motion_detected(request, camera_id):
     try:
         camera = Camera.objects.get(id=camera_id)
         
+        event_bus.publish('motion', camera.id, camera_name=camera.name)
+        
         # Processar detecção de movimento
         if camera.motion_detection_enabled and camera.recording_enabled:
             # Iniciar gravação em background
@@ -0,0 +1,50 @@
+"""
+ASGI config for dvr_system project.
+
+Usado pelas views assíncronas de streaming (DVR_SETTINGS['ASYNC_STREAMING']):
+    uvicorn dvr_system.asgi:application --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dvr_system.settings')
+
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    """Aplicação ASGI que cancela a resposta quando o cliente desconecta
+
+    O Django 4.2 não observa http.disconnect durante respostas em streaming,
+    então um stream MJPEG aberto continuaria gerando frames para um cliente
+    que já fechou a aba. Aqui as mensagens do cliente são lidas em paralelo e
+    a tarefa do Django é cancelada na desconexão, liberando a inscrição no hub.
+    """
+    if scope['type'] != 'http':
+        return await django_application(scope, receive, send)
+
+    messages = asyncio.Queue()
+
+    async def listen_for_disconnect():
+        while True:
+            message = await receive()
+            await messages.put(message)
+            if message['type'] == 'http.disconnect':
+                return
+
+    app_task = asyncio.ensure_future(django_application(scope, messages.get, send))
+    listener_task = asyncio.ensure_future(listen_for_disconnect())
+
+    try:
+        done, _ = await asyncio.wait({app_task, listener_task}, return_when=asyncio.FIRST_COMPLETED)
+        if app_task not in done:
+            app_task.cancel()
+        try:
+            await app_task
+        except asyncio.CancelledError:
+            pass
+    finally:
+        listener_task.cancel()
@@ -69,6 +69,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'dvr_system.wsgi.application'
+ASGI_APPLICATION = 'dvr_system.asgi.application'
 
 # Database
 DATABASES = {
@@ -163,8 +164,48 @@ DVR_SETTINGS = {
     'MOTION_DETECTION_SENSITIVITY': config('MOTION_DETECTION_SENSITIVITY', default=0.3, cast=float),
     'RECORDING_DURATION': config('RECORDING_DURATION', default=30, cast=int),  # seconds
     'MOTION_TIMEOUT': config('MOTION_TIMEOUT', default=4, cast=int),  # seconds
+    'MOTION_RECORDING_MAX_DURATION': config('MOTION_RECORDING_MAX_DURATION', default=300, cast=int),  # seconds (limite de um incidente)
+    # Eventos fracos são descartados na confirmação, antes de abrir a gravação: pico mínimo de
+    # pixels alterados (fração do frame) e confiança mínima (frames com movimento / frames desde
+    # o primeiro movimento); sem movimento por MOTION_CONFIRM_WINDOW frames a contagem recomeça
+    'MOTION_MIN_PEAK_RATIO': config('MOTION_MIN_PEAK_RATIO', default=0.0, cast=float),
+    'MOTION_MIN_CONFIDENCE': config('MOTION_MIN_CONFIDENCE', default=0.5, cast=float),
+    'MOTION_CONFIRM_WINDOW': config('MOTION_CONFIRM_WINDOW', default=10, cast=int),  # frames analisados
     'MOTION_START_DELAY': config('MOTION_START_DELAY', default=10, cast=int),  # seconds
     'FRAME_RATE': config('FRAME_RATE', default=15, cast=int),
+    'LIVE_STREAM_IDLE_TIMEOUT': config('LIVE_STREAM_IDLE_TIMEOUT', default=10, cast=int),  # seconds
+    'LIVE_JPEG_QUALITY': config('LIVE_JPEG_QUALITY', default=80, cast=int),
+    'SNAPSHOT_MAX_AGE': config('SNAPSHOT_MAX_AGE', default=5, cast=int),  # seconds
+    'SPRITE_CACHE_SECONDS': config('SPRITE_CACHE_SECONDS', default=5, cast=int),
+    'SPRITE_FETCH_WORKERS': config('SPRITE_FETCH_WORKERS', default=8, cast=int),
+    'EVENTS_REDIS_URL': config('EVENTS_REDIS_URL', default=CELERY_BROKER_URL),  # pub/sub dos eventos SSE
+    'DETECTION_WORKERS': config('DETECTION_WORKERS', default=0, cast=int),  # 0 = um processo por núcleo
+    'DETECTION_REBALANCE_INTERVAL': config('DETECTION_REBALANCE_INTERVAL', default=10, cast=int),  # seconds
+    # Decodificador da detecção: 'opencv' (BGR completo) ou 'ffmpeg' (cinza reduzido a DETECTION_FPS)
+    'DETECTION_DECODER': config('DETECTION_DECODER', default='opencv'),
+    'DETECTION_FPS': config('DETECTION_FPS', default=5, cast=int),
+    # Taxa de análise adaptativa: câmeras paradas há DETECTION_IDLE_AFTER segundos caem para DETECTION_IDLE_FPS
+    'DETECTION_ACTIVE_FPS': config('DETECTION_ACTIVE_FPS', default=10, cast=int),  # 0 = todos os frames
+    'DETECTION_IDLE_FPS': config('DETECTION_IDLE_FPS', default=1, cast=int),
+    'DETECTION_IDLE_AFTER': config('DETECTION_IDLE_AFTER', default=30, cast=int),  # seconds
+    # Reconexão da detecção: espera exponencial com jitter entre DETECTION_RECONNECT_MIN e _MAX
+    'DETECTION_RECONNECT_MIN': config('DETECTION_RECONNECT_MIN', default=1, cast=int),  # seconds
+    'DETECTION_RECONNECT_MAX': config('DETECTION_RECONNECT_MAX', default=60, cast=int),  # seconds
+    'DETECTION_STALL_TIMEOUT': config('DETECTION_STALL_TIMEOUT', default=15, cast=int),  # seconds sem frame
+    'DETECTION_SHUTDOWN_TIMEOUT': config('DETECTION_SHUTDOWN_TIMEOUT', default=30, cast=int),  # seconds para fechar gravações ao parar
+    # Serviço de detecção (motion_detection run): concessões de câmeras entre nós no banco
+    'DETECTION_LEASE_TTL': config('DETECTION_LEASE_TTL', default=30, cast=int),  # seconds
+    'DETECTION_LEASE_RENEW': config('DETECTION_LEASE_RENEW', default=10, cast=int),  # seconds
+    # Buffer pré-evento: últimos PREBUFFER_SECONDS do stream principal incluídos nas gravações por movimento
+    'PREBUFFER_SECONDS': config('PREBUFFER_SECONDS', default=5, cast=int),  # 0 = desativado
+    'PREBUFFER_SEGMENT_TIME': config('PREBUFFER_SEGMENT_TIME', default=1, cast=int),  # seconds
+    'PREBUFFER_PATH': config('PREBUFFER_PATH', default=''),  # vazio = /dev/shm/dvr_prebuffer
+    'HLS_PATH': config('HLS_PATH', default=''),  # vazio = /dev/shm/dvr_hls
+    'HLS_SEGMENT_TIME': config('HLS_SEGMENT_TIME', default=1, cast=int),  # seconds
+    'HLS_LIST_SIZE': config('HLS_LIST_SIZE', default=6, cast=int),
+    'HLS_IDLE_TIMEOUT': config('HLS_IDLE_TIMEOUT', default=30, cast=int),  # seconds
+    # Usar as views assíncronas de streaming (requer servidor ASGI, ver dvr_system/asgi.py)
+    'ASYNC_STREAMING': config('ASYNC_STREAMING', default=False, cast=bool),
     'VIDEO_CODEC': 'libx264',
     'AUDIO_CODEC': 'aac',
 }
@@ -61,7 +61,7 @@ class RecordingSettingsAdmin(admin.ModelAdmin):
 
 @admin.register(MotionEvent)
 class MotionEventAdmin(admin.ModelAdmin):
-    list_display = ['camera', 'start_time', 'duration', 'confidence', 'area_affected']
+    list_display = ['camera', 'start_time', 'duration', 'confidence', 'peak_ratio', 'area_affected', 'trigger_frames']
     list_filter = ['start_time', 'camera']
     search_fields = ['camera__name']
     readonly_fields = ['id', 'start_time', 'end_time']
@@ -71,6 +71,6 @@ class MotionEventAdmin(admin.ModelAdmin):
             'fields': ('camera', 'recording', 'start_time', 'end_time', 'duration')
         }),
         ('Detecção', {
-            'fields': ('confidence', 'area_affected')
+            'fields': ('confidence', 'peak_ratio', 'mean_ratio', 'area_affected', 'bbox', 'trigger_frames')
         }),
     ) 
\ No newline at end of file
@@ -0,0 +1,199 @@
+import os
+import subprocess
+import threading
+import time
+from datetime import datetime
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import Recording, MotionEvent
+from .prebuffer import prebuffer_manager
+from cameras.events import event_bus
+
+
+def motion_recording_command(stream_url, frame_rate, filepath, duration=None):
+    """Comando FFmpeg da gravação por movimento conectando direto à câmera
+
+    Sem duration o ffmpeg grava até receber 'q' no stdin.
+    """
+    cmd = [
+        'ffmpeg',
+        '-i', stream_url,
+        '-c:v', 'libx264',  # Usar H.264 diretamente
+        '-c:a', 'aac',
+        '-r', str(frame_rate),
+        '-preset', 'ultrafast',  # Codificação mais rápida
+        '-crf', '25',  # Qualidade um pouco menor para estabilidade
+        '-f', 'mp4',
+    ]
+    if duration is not None:
+        cmd += ['-t', str(duration)]
+    cmd += [
+        '-avoid_negative_ts', 'make_zero',  # Evitar timestamps negativos
+        '-fflags', '+genpts',  # Gerar timestamps
+        '-movflags', '+faststart',  # Otimizar para streaming
+        '-y',  # Sobrescrever arquivo
+        filepath,
+    ]
+    return cmd
+
+
+def save_motion_recording(camera, filepath, filename, duration, area_affected=0, start_time=None, metrics=None):
+    """Cria a gravação e o evento de movimento de um arquivo já gravado
+
+    metrics são os campos medidos pelo detector (MotionMetrics.to_dict());
+    sem eles o evento registra apenas a área informada.
+    """
+    end_time = timezone.now()
+    recording = Recording.objects.create(
+        camera=camera,
+        file_path=filepath,
+        file_name=filename,
+        file_size=os.path.getsize(filepath),
+        duration=duration,
+        recording_type='motion',
+        motion_detected=True,
+        end_time=end_time
+    )
+    fields = {'area_affected': area_affected}
+    fields.update(metrics or {})
+    event = MotionEvent.objects.create(
+        camera=camera,
+        recording=recording,
+        end_time=end_time,
+        duration=duration,
+        **fields
+    )
+    if start_time is not None:
+        # start_time é auto_now_add; o vídeo começa antes do registro ser criado
+        Recording.objects.filter(pk=recording.pk).update(start_time=start_time)
+        MotionEvent.objects.filter(pk=event.pk).update(start_time=start_time)
+    return recording
+
+
+class MotionIncident:
+    """Um incidente de movimento: uma gravação e um MotionEvent do disparo ao silêncio
+
+    A gravação fica aberta enquanto houver movimento e termina
+    motion_timeout segundos após o último frame com movimento (ou ao atingir
+    max_duration). Com buffer pré-evento ela inclui os segundos anteriores
+    ao disparo; sem ele um ffmpeg conectado à câmera grava até o fim.
+    metrics (MotionMetrics) acumula a intensidade de todos os frames do
+    incidente e é gravada no MotionEvent. Movimento fraco é filtrado antes
+    de o incidente ser aberto, não depois da gravação.
+    """
+
+    def __init__(self, camera, metrics, motion_timeout=4, max_duration=300):
+        self.camera = camera
+        self.metrics = metrics
+        self.motion_timeout = motion_timeout
+        self.max_duration = max_duration
+        self.started_at = time.time()
+        self.last_motion = self.started_at
+        self.closed_at = None
+        # Se start() foi chamado (câmera com gravação habilitada)
+        self.recording = False
+        self.filename = f"motion_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4"
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    @classmethod
+    def for_camera(cls, camera, metrics):
+        """Incidente com o motion_timeout do CameraSettings da câmera"""
+        camera_settings = getattr(camera, 'settings', None)
+        return cls(
+            camera,
+            metrics,
+            motion_timeout=getattr(camera_settings, 'motion_timeout', settings.DVR_SETTINGS.get('MOTION_TIMEOUT', 4)),
+            max_duration=settings.DVR_SETTINGS.get('MOTION_RECORDING_MAX_DURATION', 300),
+        )
+
+    def start(self):
+        self.recording = True
+        self.thread.start()
+        return self
+
+    def until(self):
+        """Horário em que a gravação termina se não houver mais movimento"""
+        end = min(self.last_motion + self.motion_timeout, self.started_at + self.max_duration)
+        return min(end, self.closed_at) if self.closed_at else end
+
+    def is_open(self):
+        """Se movimento agora ainda pertence a este incidente
+
+        Uma gravação que terminou antes da hora (buffer ou ffmpeg caiu)
+        encerra o incidente, para que o próximo movimento abra outro.
+        """
+        if self.recording and not self.thread.is_alive():
+            return False
+        return time.time() < self.until()
+
+    def is_alive(self):
+        """Se a gravação ainda está sendo escrita"""
+        return self.thread.is_alive()
+
+    def update(self, state):
+        """Registra um frame analisado; movimento adia o fim da gravação"""
+        self.metrics.add(state)
+        if state.motion:
+            self.last_motion = time.time()
+
+    def close(self):
+        """Encerra a gravação agora (ex.: detecção parada)"""
+        self.closed_at = time.time()
+
+    def _run(self):
+        camera = self.camera
+        camera_dir = os.path.join(settings.DVR_SETTINGS['RECORDINGS_PATH'], 'videos', str(camera.id))
+        os.makedirs(camera_dir, exist_ok=True)
+        filepath = os.path.join(camera_dir, self.filename)
+
+        buffer = prebuffer_manager.get(camera.id)
+        print(f"🎬 Gravação do incidente iniciada: {self.filename}" + (" (com buffer pré-evento)" if buffer else ""))
+        event_bus.publish('recording_started', camera.id, recording_type='motion', file_name=self.filename)
+        try:
+            if buffer is not None:
+                result = buffer.record(filepath, self.until)
+            else:
+                result = self._record_live(filepath)
+
+            if result is not None and os.path.exists(filepath) and os.path.getsize(filepath) > 1024:
+                start_time, duration = result
+                save_motion_recording(
+                    camera, filepath, self.filename, duration,
+                    start_time=start_time, metrics=self.metrics.to_dict(),
+                )
+                print(f"✅ Incidente gravado: {self.filename} ({duration}s, confiança {self.metrics.confidence:.2f})")
+            else:
+                print(f"❌ Gravação do incidente falhou: {self.filename}")
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+        except Exception as e:
+            print(f"❌ Erro na gravação do incidente {self.filename}: {e}")
+        finally:
+            event_bus.publish('recording_stopped', camera.id, recording_type='motion', file_name=self.filename)
+            # Conexão de banco própria desta thread
+            connection.close()
+
+    def _record_live(self, filepath):
+        """Grava direto da câmera até o fim do incidente"""
+        frame_rate = getattr(getattr(self.camera, 'settings', None), 'frame_rate', 15)
+        start_time = timezone.now()
+        started = time.time()
+        process = subprocess.Popen(
+            motion_recording_command(self.camera.get_stream_url(), frame_rate, filepath),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        while process.poll() is None and time.time() < self.until():
+            time.sleep(0.5)
+
+        if process.poll() is None:
+            # 'q' encerra o ffmpeg escrevendo o índice do MP4
+            try:
+                process.communicate(b'q', timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        return start_time, int(round(time.time() - started))
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0002_recording_conversion_error_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='motionevent',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Data de Criação'),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recordings', '0003_motionevent_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='motionevent',
+            name='peak_ratio',
+            field=models.FloatField(db_index=True, default=0.0, verbose_name='Pico de Pixels Alterados'),
+        ),
+        migrations.AddField(
+            model_name='motionevent',
+            name='mean_ratio',
+            field=models.FloatField(default=0.0, verbose_name='Média de Pixels Alterados'),
+        ),
+        migrations.AddField(
+            model_name='motionevent',
+            name='bbox',
+            field=models.JSONField(blank=True, null=True, verbose_name='Retângulo da Maior Região'),
+        ),
+        migrations.AddField(
+            model_name='motionevent',
+            name='trigger_frames',
+            field=models.IntegerField(default=0, verbose_name='Frames com Movimento'),
+        ),
+    ]
@@ -154,6 +154,12 @@ class MotionEvent(models.Model):
     duration = models.IntegerField(default=0, verbose_name='Duração (segundos)')
     confidence = models.FloatField(default=0.0, verbose_name='Confiança da Detecção')
     area_affected = models.IntegerField(default=0, verbose_name='Área Afetada (pixels)')
+    # Fração do frame com pixels alterados, no frame mais intenso e em média
+    peak_ratio = models.FloatField(default=0.0, db_index=True, verbose_name='Pico de Pixels Alterados')
+    mean_ratio = models.FloatField(default=0.0, verbose_name='Média de Pixels Alterados')
+    # [x, y, largura, altura] da maior região, em pixels do stream
+    bbox = models.JSONField(null=True, blank=True, verbose_name='Retângulo da Maior Região')
+    trigger_frames = models.IntegerField(default=0, verbose_name='Frames com Movimento')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')
     
     class Meta:
@@ -164,6 +170,10 @@ class MotionEvent(models.Model):
     def __str__(self):
         return f"{self.camera.name} - {self.start_time.strftime('%d/%m/%Y %H:%M:%S')}"
     
+    def get_peak_percent(self):
+        """Retorna o pico de pixels alterados em porcentagem do quadro"""
+        return round(self.peak_ratio * 100, 2)
+    
     def end_event(self):
         """Finaliza o evento de movimento"""
         self.end_time = timezone.now()
@@ -0,0 +1,301 @@
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+from django.conf import settings
+
+from cameras.supervisor import ReconnectBackoff
+
+
+def get_prebuffer_root():
+    """Diretório base dos buffers pré-evento (tmpfs quando disponível)"""
+    path = settings.DVR_SETTINGS.get('PREBUFFER_PATH')
+    if not path:
+        base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        path = os.path.join(base, 'dvr_prebuffer')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class Segment:
+    """Um segmento MPEG-TS da playlist do buffer"""
+
+    def __init__(self, sequence, name, duration, started_at):
+        self.sequence = sequence
+        self.name = name
+        self.duration = duration
+        # Hora de início (EXT-X-PROGRAM-DATE-TIME) ou None
+        self.started_at = started_at
+
+
+class PreEventBuffer:
+    """Últimos segundos do stream principal de uma câmera, sempre em disco
+
+    Um ffmpeg conectado o tempo todo remuxa o stream (-c copy, sem
+    transcodificação) em segmentos MPEG-TS numa playlist deslizante no tmpfs,
+    apagando os antigos. Uma gravação por movimento começa pelos segmentos
+    já em buffer e continua com os próximos que o mesmo ffmpeg escrever, sem
+    reconectar à câmera nem esperar um quadro-chave.
+    """
+
+    PLAYLIST_NAME = 'buffer.m3u8'
+
+    def __init__(self, camera_id, stream_url, seconds=5):
+        self.camera_id = camera_id
+        self.stream_url = stream_url
+        self.seconds = seconds
+        # Diretório por processo: um shard que assume a câmera não disputa o do anterior
+        self.output_dir = os.path.join(get_prebuffer_root(), f'{camera_id}-{os.getpid()}')
+        self.process = None
+        self.started_at = 0
+        # Reinício do ffmpeg que morreu sozinho (PreBufferManager.revive)
+        self.backoff = ReconnectBackoff.from_settings()
+        self.retry_at = 0
+
+    @property
+    def playlist_path(self):
+        return os.path.join(self.output_dir, self.PLAYLIST_NAME)
+
+    def build_command(self):
+        """Monta o comando ffmpeg que mantém a playlist deslizante"""
+        segment_time = settings.DVR_SETTINGS.get('PREBUFFER_SEGMENT_TIME', 1)
+        # Com -c:v copy o corte só acontece num quadro-chave, então cada segmento dura
+        # pelo menos segment_time (um GOP, se for maior) e a lista cobre ao menos a
+        # janela; record() usa as durações reais para não começar antes dela.
+        # Um segmento a mais: o mais antigo da lista pode já ter começado antes da janela
+        list_size = math.ceil(self.seconds / segment_time) + 1
+
+        cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error']
+        if self.stream_url.startswith('rtsp://'):
+            cmd += ['-rtsp_transport', 'tcp']
+        cmd += [
+            '-i', self.stream_url,
+            '-map', '0:v:0',
+            '-c:v', 'copy',  # Apenas remux: nenhuma decodificação ou codificação
+            '-an',  # Áudio de câmeras (G.711 etc.) não cabe em MPEG-TS sem transcodificar
+            '-f', 'hls',
+            '-hls_time', str(segment_time),
+            '-hls_list_size', str(list_size),
+            '-hls_flags', 'delete_segments+omit_endlist+program_date_time',
+            '-hls_segment_filename', os.path.join(self.output_dir, 'seg_%06d.ts'),
+            '-y',
+            self.playlist_path,
+        ]
+        return cmd
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def has_died(self):
+        """Se o ffmpeg terminou sem stop() (ex.: stream principal caiu)"""
+        return self.process is not None and self.process.poll() is not None
+
+    def start(self):
+        """Inicia o ffmpeg limpando segmentos de execuções anteriores"""
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        self.process = subprocess.Popen(
+            self.build_command(),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.started_at = time.time()
+        print(f"⏪ Buffer pré-evento de {self.seconds}s iniciado para câmera {self.camera_id}")
+
+    def stop(self):
+        """Encerra o ffmpeg e remove os segmentos"""
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        print(f"🛑 Buffer pré-evento finalizado para câmera {self.camera_id}")
+
+    def segments(self):
+        """Segmentos completos listados na playlist, do mais antigo ao mais novo"""
+        try:
+            with open(self.playlist_path) as playlist:
+                lines = playlist.read().splitlines()
+        except FileNotFoundError:
+            return []
+
+        segments = []
+        sequence = 0
+        duration = 0
+        started_at = None
+        for line in lines:
+            if line.startswith('#EXT-X-MEDIA-SEQUENCE:'):
+                sequence = int(line.split(':', 1)[1])
+            elif line.startswith('#EXTINF:'):
+                duration = float(line.split(':', 1)[1].rstrip(','))
+            elif line.startswith('#EXT-X-PROGRAM-DATE-TIME:'):
+                try:
+                    started_at = datetime.strptime(line.split(':', 1)[1], '%Y-%m-%dT%H:%M:%S.%f%z')
+                except ValueError:
+                    started_at = None
+            elif line and not line.startswith('#'):
+                segments.append(Segment(sequence, line, duration, started_at))
+                sequence += 1
+                duration = 0
+                started_at = None
+        return segments
+
+    def window(self, segments):
+        """Segmentos mais novos que somam self.seconds pelas durações da playlist"""
+        covered = 0
+        for index in range(len(segments) - 1, -1, -1):
+            covered += segments[index].duration
+            if covered >= self.seconds:
+                return segments[index:]
+        return segments
+
+    def record(self, output_path, until, timeout=10):
+        """Grava o buffer e a continuação ao vivo em output_path (MP4)
+
+        until() devolve o horário em que a gravação deve terminar e é
+        consultada a cada segmento, então quem grava pode estendê-la enquanto
+        houver movimento. Os segmentos são anexados a um .ts temporário ao
+        lado do destino assim que aparecem na playlist (antes que o ffmpeg os
+        apague) e, ao final, remuxados para MP4. Retorna (início, duração em
+        segundos) ou None.
+        """
+        partial_path = output_path + '.ts'
+        last_sequence = None
+        started_at = None
+        recorded = 0
+
+        with open(partial_path, 'wb') as partial:
+            while True:
+                segments = self.segments()
+                if last_sequence is None:
+                    segments = self.window(segments)
+                for segment in segments:
+                    if last_sequence is not None and segment.sequence <= last_sequence:
+                        continue
+                    try:
+                        with open(os.path.join(self.output_dir, segment.name), 'rb') as data:
+                            shutil.copyfileobj(data, partial)
+                    except FileNotFoundError:
+                        # Já apagado pelo ffmpeg; segue com o próximo
+                        pass
+                    else:
+                        if started_at is None:
+                            started_at = segment.started_at
+                        recorded += segment.duration
+                    last_sequence = segment.sequence
+
+                now = time.time()
+                end = until()
+                # O segmento em curso só aparece na playlist no próximo quadro-chave
+                if now >= end and (started_at is None or started_at.timestamp() + recorded >= end):
+                    break
+                if now >= end + timeout or not self.is_running():
+                    print(f"⚠️ Buffer da câmera {self.camera_id} parou de gerar segmentos")
+                    break
+                time.sleep(0.5)
+
+        try:
+            if not recorded:
+                return None
+            result = subprocess.run(
+                [
+                    'ffmpeg', '-hide_banner', '-loglevel', 'error',
+                    '-i', partial_path,
+                    '-c', 'copy',
+                    '-movflags', '+faststart',
+                    '-y', output_path,
+                ],
+                capture_output=True,
+                text=True,
+                timeout=60,
+            )
+            if result.returncode != 0:
+                print(f"❌ Erro ao gerar {output_path} a partir do buffer: {result.stderr.strip()}")
+                return None
+            return started_at, int(round(recorded))
+        finally:
+            try:
+                os.remove(partial_path)
+            except OSError:
+                pass
+
+
+class PreBufferManager:
+    """Mantém um buffer pré-evento por câmera no processo da detecção"""
+
+    def __init__(self):
+        self.buffers = {}
+        self.lock = threading.Lock()
+
+    def start(self, camera):
+        """Inicia (ou reinicia, se o ffmpeg morreu) o buffer da câmera"""
+        seconds = settings.DVR_SETTINGS.get('PREBUFFER_SECONDS', 5)
+        if seconds <= 0 or not camera.recording_enabled:
+            return None
+
+        camera_id = str(camera.id)
+        stream_url = camera.get_stream_url()
+        with self.lock:
+            buffer = self.buffers.get(camera_id)
+            if buffer is not None and buffer.stream_url != stream_url:
+                buffer.stop()
+                buffer = None
+            if buffer is None:
+                buffer = PreEventBuffer(camera_id, stream_url, seconds)
+                self.buffers[camera_id] = buffer
+            if not buffer.is_running():
+                buffer.start()
+            return buffer
+
+    def revive(self):
+        """Reinicia os buffers cujo ffmpeg morreu, com espera exponencial
+
+        O buffer lê o stream principal e a detecção o substream: se só o
+        principal cair, a detecção não reconecta e o buffer ficaria parado,
+        com as gravações voltando à conexão direta sem pré-evento.
+        """
+        now = time.time()
+        with self.lock:
+            for buffer in self.buffers.values():
+                if not buffer.has_died():
+                    continue
+                if not buffer.retry_at:
+                    delay = buffer.backoff.next_delay(now - buffer.started_at)
+                    buffer.retry_at = now + delay
+                    print(f"⚠️ Buffer pré-evento da câmera {buffer.camera_id} parou; reiniciando em {delay:.1f}s")
+                elif now >= buffer.retry_at:
+                    buffer.retry_at = 0
+                    buffer.start()
+
+    def get(self, camera_id):
+        """Buffer em execução da câmera ou None"""
+        buffer = self.buffers.get(str(camera_id))
+        if buffer is not None and buffer.is_running():
+            return buffer
+        return None
+
+    def stop(self, camera_id):
+        with self.lock:
+            buffer = self.buffers.pop(str(camera_id), None)
+        if buffer is not None:
+            buffer.stop()
+
+    def stop_all(self):
+        with self.lock:
+            buffers = list(self.buffers.values())
+            self.buffers.clear()
+        for buffer in buffers:
+            buffer.stop()
+
+
+# Instância global dos buffers pré-evento
+prebuffer_manager = PreBufferManager()
@@ -11,15 +11,21 @@ import logging
 import subprocess
 
 from .models import Recording, RecordingSettings, MotionEvent
+from .incidents import motion_recording_command, save_motion_recording
 from cameras.models import Camera
+from cameras.events import event_bus
 from .utils import convert_recording, batch_convert_recordings, cleanup_converted_files
 
 logger = logging.getLogger(__name__)
 
 
 @shared_task
-def start_motion_recording(camera_id):
-    """Inicia gravação por detecção de movimento"""
+def start_motion_recording(camera_id, area_affected=0, metrics=None):
+    """Inicia gravação por detecção de movimento
+
+    area_affected é a área da maior região em movimento (pixels do stream);
+    metrics são as medidas do detector (MotionMetrics.to_dict()), se houver.
+    """
     try:
         camera = Camera.objects.get(id=camera_id)
         
@@ -61,30 +67,19 @@ def start_motion_recording(camera_id):
             import subprocess
             
             # Comando FFmpeg para gravação com configurações mais robustas
-            cmd = [
-                'ffmpeg',
-                '-i', stream_url,
-                '-c:v', 'libx264',  # Usar H.264 diretamente
-                '-c:a', 'aac',
-                '-r', str(frame_rate),
-                '-preset', 'ultrafast',  # Codificação mais rápida
-                '-crf', '25',  # Qualidade um pouco menor para estabilidade
-                '-f', 'mp4',
-                '-t', str(recording_duration),
-                '-avoid_negative_ts', 'make_zero',  # Evitar timestamps negativos
-                '-fflags', '+genpts',  # Gerar timestamps
-                '-movflags', '+faststart',  # Otimizar para streaming
-                '-y',  # Sobrescrever arquivo
-                filepath
-            ]
+            cmd = motion_recording_command(stream_url, frame_rate, filepath, recording_duration)
             
             # Executar gravação com timeout maior
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=recording_duration + 30  # Timeout maior que a duração
-            )
+            event_bus.publish('recording_started', camera.id, recording_type='motion', file_name=filename)
+            try:
+                result = subprocess.run(
+                    cmd,
+                    capture_output=True,
+                    text=True,
+                    timeout=recording_duration + 30  # Timeout maior que a duração
+                )
+            finally:
+                event_bus.publish('recording_stopped', camera.id, recording_type='motion', file_name=filename)
             
             # Verificar se o arquivo foi criado e tem tamanho adequado
             if os.path.exists(filepath):
@@ -95,27 +90,8 @@ def start_motion_recording(camera_id):
                 if file_size > 1024:
                     print(f"✅ Gravação bem-sucedida: {filename} ({file_size} bytes)")
                     
-                    # Criar registro da gravação
-                    recording = Recording.objects.create(
-                        camera=camera,
-                        file_path=filepath,
-                        file_name=filename,
-                        file_size=file_size,
-                        duration=recording_duration,
-                        recording_type='motion',
-                        motion_detected=True,
-                        end_time=timezone.now()
-                    )
-                    
-                    # Criar evento de movimento
-                    MotionEvent.objects.create(
-                        camera=camera,
-                        recording=recording,
-                        duration=recording_duration,
-                        confidence=0.8,  # Valor padrão
-                        area_affected=1000  # Valor padrão
-                    )
-                    
+                    # Criar registro da gravação e evento de movimento
+                    save_motion_recording(camera, filepath, filename, recording_duration, area_affected, metrics=metrics)
                     return True
                 else:
                     print(f"❌ Arquivo muito pequeno: {file_size} bytes")
@@ -217,12 +193,16 @@ def start_manual_recording(camera_id, duration=30):
             ]
             
             # Executar gravação com timeout maior
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=duration + 30  # Timeout maior que a duração
-            )
+            event_bus.publish('recording_started', camera.id, recording_type='manual', file_name=filename)
+            try:
+                result = subprocess.run(
+                    cmd,
+                    capture_output=True,
+                    text=True,
+                    timeout=duration + 30  # Timeout maior que a duração
+                )
+            finally:
+                event_bus.publish('recording_stopped', camera.id, recording_type='manual', file_name=filename)
             
             # Verificar se o arquivo foi criado e tem tamanho adequado
             if os.path.exists(filepath):
@@ -1,4 +1,5 @@
 from django.urls import path
+from django.conf import settings
 from . import views
 
 app_name = 'recordings'
@@ -9,7 +10,9 @@ urlpatterns = [
     path('<uuid:recording_id>/', views.recording_detail, name='recording_detail'),
     path('<uuid:recording_id>/play/', views.recording_play, name='recording_play'),
     path('<uuid:recording_id>/play/test/', views.recording_play_test, name='recording_play_test'),
-    path('<uuid:recording_id>/stream/', views.recording_stream, name='recording_stream'),
+    path('<uuid:recording_id>/stream/',
+         views.recording_stream_async if settings.DVR_SETTINGS['ASYNC_STREAMING'] else views.recording_stream,
+         name='recording_stream'),
     path('<uuid:recording_id>/static/', views.recording_static, name='recording_static'),
     path('<uuid:recording_id>/download/', views.recording_download, name='recording_download'),
     path('<uuid:recording_id>/download/converted/', views.recording_download_converted, name='recording_download_converted'),
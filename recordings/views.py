@@ -1,7 +1,8 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, FileResponse, Http404, StreamingHttpResponse
+from django.http import JsonResponse, FileResponse, Http404, StreamingHttpResponse, HttpResponse
+from django.contrib.auth.views import redirect_to_login
 from django.core.paginator import Paginator
 from django.db.models import Q, Sum
 from django.utils import timezone
@@ -10,6 +11,8 @@ import os
 from datetime import datetime, timedelta
 import mimetypes
 import re
+import asyncio
+from asgiref.sync import sync_to_async
 
 from .models import Recording, RecordingSettings, MotionEvent
 from .forms import RecordingSettingsForm
@@ -17,6 +20,10 @@ from .utils import convert_recording, batch_convert_recordings, get_video_info,
 from cameras.models import Camera
 
 
+# Tamanho dos blocos enviados pelo streaming assíncrono de gravações
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
 @login_required
 def recording_list(request):
     """Lista todas as gravações"""
@@ -149,11 +156,8 @@ def recording_download_converted(request, recording_id):
     return response
 
 
-@login_required
-def recording_stream(request, recording_id):
-    """Stream de uma gravação para o player de vídeo"""
-    recording = get_object_or_404(Recording, id=recording_id, is_deleted=False)
-    
+def get_streamable_file(recording):
+    """Retorna (caminho, content_type) do arquivo reproduzível pelo navegador"""
     # SEMPRE priorizar arquivo convertido para streaming (H.264 é compatível com navegadores)
     if recording.converted_file_exists:
         file_path = recording.converted_file_path
@@ -174,6 +178,15 @@ def recording_stream(request, recording_id):
     else:
         raise Http404("Arquivo não encontrado")
     
+    return file_path, content_type
+
+
+@login_required
+def recording_stream(request, recording_id):
+    """Stream de uma gravação para o player de vídeo"""
+    recording = get_object_or_404(Recording, id=recording_id, is_deleted=False)
+    file_path, content_type = get_streamable_file(recording)
+    
     # Verificar se é uma requisição de range (necessário para streaming)
     range_header = request.META.get('HTTP_RANGE', '').strip()
     range_match = re.match(r'bytes=(\d+)-(\d*)', range_header)
@@ -228,6 +241,72 @@ def recording_stream(request, recording_id):
             raise Http404("Erro ao acessar arquivo")
 
 
+async def read_file_chunks(file_path, start, length, chunk_size=STREAM_CHUNK_SIZE):
+    """Iterador assíncrono sobre um trecho do arquivo, lido em blocos"""
+    f = await asyncio.to_thread(open, file_path, 'rb')
+    try:
+        await asyncio.to_thread(f.seek, start)
+        remaining = length
+        while remaining > 0:
+            data = await asyncio.to_thread(f.read, min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+async def recording_stream_async(request, recording_id):
+    """Versão ASGI de recording_stream
+    
+    O arquivo é enviado em blocos por um iterador assíncrono, sem prender
+    uma thread do servidor durante toda a reprodução.
+    """
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    
+    try:
+        recording = await Recording.objects.aget(id=recording_id, is_deleted=False)
+    except Recording.DoesNotExist:
+        raise Http404("Gravação não encontrada")
+    
+    # Pode executar ffprobe: fora do event loop
+    file_path, content_type = await asyncio.to_thread(get_streamable_file, recording)
+    file_size = await asyncio.to_thread(os.path.getsize, file_path)
+    
+    range_header = request.META.get('HTTP_RANGE', '').strip()
+    range_match = re.match(r'bytes=(\d+)-(\d*)', range_header)
+    
+    if range_match:
+        start = int(range_match.group(1))
+        end = int(range_match.group(2)) if range_match.group(2) else file_size - 1
+        end = min(end, file_size - 1)
+        
+        if start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{file_size}'
+            return response
+        
+        length = end - start + 1
+        response = StreamingHttpResponse(read_file_chunks(file_path, start, length), status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{file_size}'
+    else:
+        length = file_size
+        response = StreamingHttpResponse(read_file_chunks(file_path, 0, length))
+        response['Content-Disposition'] = 'inline'
+    
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Type'] = content_type
+    response['Access-Control-Allow-Origin'] = '*'
+    response['Access-Control-Allow-Methods'] = 'GET, HEAD'
+    response['Access-Control-Allow-Headers'] = 'Range'
+    
+    return response
+
+
 @login_required
 def recording_static(request, recording_id):
     """Serve o vídeo como arquivo estático (alternativa para compatibilidade)"""
@@ -340,10 +419,18 @@ def motion_events(request):
     camera_id = request.GET.get('camera')
     date_from = request.GET.get('date_from')
     date_to = request.GET.get('date_to')
+    min_ratio = request.GET.get('min_ratio')
     
     if camera_id:
         events = events.filter(camera_id=camera_id)
     
+    if min_ratio:
+        # Intensidade mínima: porcentagem do quadro com pixels alterados
+        try:
+            events = events.filter(peak_ratio__gte=float(min_ratio) / 100)
+        except ValueError:
+            pass
+    
     if date_from:
         try:
             date_from = datetime.strptime(date_from, '%Y-%m-%d')